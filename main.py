@@ -7,14 +7,57 @@ from rich.console import Console
 
 sys.path.append(str(Path(__file__).parent))
 
-from src.cli import main
+STARTUP_BUDGET_MS = 500
+
+def startup_profile(top: int = 15):
+    """Re-imports the CLI in a fresh interpreter under -X importtime and reports the slowest modules."""
+    import subprocess
+    from rich.table import Table
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.cli"],
+        cwd=str(Path(__file__).parent), capture_output=True, text=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+
+    if not rows:
+        console.print(f"[red]Import profiling failed:[/red]\n{proc.stderr[-2000:]}")
+        return 1
+
+    total_ms = next((c for n, _, c in rows if n == "src.cli"), max(c for _, _, c in rows)) / 1000
+    table = Table(title=f"Slowest imports (top {top} by cumulative time)")
+    table.add_column("Module", style="cyan")
+    table.add_column("Self (ms)", justify="right")
+    table.add_column("Cumulative (ms)", justify="right", style="bold")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        table.add_row(name, f"{self_us / 1000:.1f}", f"{cumulative_us / 1000:.1f}")
+    console.print(table)
+
+    color = "green" if total_ms <= STARTUP_BUDGET_MS else "red"
+    console.print(f"[{color}]import src.cli: {total_ms:.0f} ms (budget {STARTUP_BUDGET_MS} ms)[/{color}]")
+    return 0 if total_ms <= STARTUP_BUDGET_MS else 2
 
 console = Console()
 
 def handle_exit(sig, frame):
+    from src.core.memory import memory_core
+    memory_core.close()
     os._exit(0)
 
 if __name__ == "__main__":
+    if "--startup-profile" in sys.argv:
+        sys.exit(startup_profile())
+
+    from src.cli import main
+
     signal.signal(signal.SIGINT, handle_exit)
     signal.signal(signal.SIGTERM, handle_exit)
 
@@ -7,15 +7,15 @@ from rich.markdown import Markdown
 from rich.prompt import Prompt, IntPrompt
 from rich.table import Table
 from rich.align import Align
+from rich.live import Live
 
-from src.config import load_config
-from src.providers.pollinations import PollinationsProvider
-from src.providers.gemini import GeminiProvider, fetch_available_models
-from src.providers.openrouter import OpenRouterProvider
-from src.providers.openai import OpenAIProvider
-from src.providers.anthropic import AnthropicProvider
+from src.config import get_settings
+from src.providers.factory import build_provider
 from src.core.orchestrator import Orchestrator
 from src.core.memory import memory_core
+from src.core import http_pool
+from src.core.dispatcher import tool_dispatcher
+from src.core.mcp_manager import mcp_registry
 
 console = Console()
 
@@ -25,9 +25,30 @@ class CC:
         for arg in args:
             console.print(Align.center(arg, vertical="middle"))
 
+class StreamView:
+    """Transient live panel for a reply that is still streaming."""
+    def __init__(self):
+        self.live = None
+
+    def __call__(self, text):
+        if text is None:
+            self.close()
+            return
+        renderable = Panel(Markdown(text), border_style="purple")
+        if self.live:
+            self.live.update(renderable)
+        else:
+            self.live = Live(renderable, console=console, refresh_per_second=12, transient=True)
+            self.live.start()
+
+    def close(self):
+        if self.live:
+            self.live.stop()
+            self.live = None
+
 class ZervGenCLI:
     def __init__(self):
-        self.config = load_config()
+        self.config = get_settings()
         self.orchestrator = None
 
     def _init_system(self):
@@ -44,22 +65,22 @@ class ZervGenCLI:
             CC.print("[yellow]Falling back to Pollinations (Safe Mode)...[/yellow]")
 
             self.config.provider = "pollinations"
-            provider = PollinationsProvider(self.config.pollinations)
+            provider = build_provider(self.config, "pollinations")
             self.orchestrator = Orchestrator(provider, self.config)
 
             Prompt.ask("\n[bold white on red] Press Enter to acknowledge [/bold white on red]")
 
     def _get_provider(self):
-        if self.config.provider == "gemini":
-            return GeminiProvider(self.config.gemini)
-        elif self.config.provider == "openrouter":
-            return OpenRouterProvider(self.config.openrouter)
-        elif self.config.provider == "openai":
-            return OpenAIProvider(self.config.openai)
-        elif self.config.provider == "anthropic":
-            return AnthropicProvider(self.config.anthropic)
-        else:
-            return PollinationsProvider(self.config.pollinations)
+        return build_provider(self.config)
+
+    async def shutdown(self):
+        if self.orchestrator:
+            await mcp_registry.release()
+        await http_pool.close_all()
+        tool_dispatcher.shutdown()
+        from src.core.sandbox import sandbox
+        await asyncio.to_thread(sandbox.shutdown)
+        memory_core.close()
 
     def print_banner(self):
         console.clear()
@@ -105,13 +126,14 @@ class ZervGenCLI:
         if self.config.provider == "openrouter": return self.config.openrouter.model.split("/")[-1]
         if self.config.provider == "openai": return self.config.openai.model
         if self.config.provider == "anthropic": return self.config.anthropic.model
+        if self.config.provider == "router": return f"{len(self.config.router.backends)} backends"
         return "Default"
 
     def handle_system_command(self, cmd: str) -> bool:
         from src.config import MODES
         from src.skills_loader import get_all_roles
         import datetime
-        valid_commands = ["/history", "/time", "/clear", "/memory", "/evolve", "/search", "/help", "/mode", "/role"]
+        valid_commands = ["/history", "/time", "/clear", "/memory", "/evolve", "/search", "/help", "/mode", "/role", "/agents", "/mcp", "/cache", "/providers"]
         parts = cmd.split()
         command = parts[0].lower()
         args = parts[1] if len(parts) > 1 else None
@@ -126,6 +148,10 @@ class ZervGenCLI:
 /time    - Show current system time
 /clear   - Clear short-term conversation history
 /memory  - Show long-term memory statistics
+/agents  - Show sub-agent pool reuse statistics
+/mcp     - Show MCP server status, processes and memory
+/cache   - Show response cache hit statistics
+/providers - Show router backend latency and error rates
 /evolve  - Force memory consolidation/evolution
 /search  - Semantic search in long-term memory
 /load    - Load your sessions
@@ -155,6 +181,7 @@ back     - Return to main menu
         elif cmd == "/clear":
             if self.orchestrator:
                 self.orchestrator.history = []
+                self.orchestrator.history_manager.reset()
             CC.print("[yellow]Session History Cleared.[/yellow]")
             return True
 
@@ -163,6 +190,30 @@ back     - Return to main menu
             CC.print(Panel(stats, title="Memory System Stats", border_style="green"))
             return True
 
+        elif cmd == "/mcp":
+            CC.print(Panel(mcp_registry.report(), title="MCP Servers", border_style="cyan"))
+            return True
+
+        elif cmd == "/cache":
+            from src.providers.cached import CachedProvider
+            brain = self.orchestrator.brain if self.orchestrator else None
+            report = brain.report() if isinstance(brain, CachedProvider) else "Response cache disabled (response_cache.enabled)."
+            CC.print(Panel(report, title="Response Cache", border_style="cyan"))
+            return True
+
+        elif cmd == "/providers":
+            from src.providers.router import RouterProvider
+            brain = self.orchestrator.brain if self.orchestrator else None
+            brain = getattr(brain, "inner", brain)
+            report = brain.report() if isinstance(brain, RouterProvider) else "Router not active (set provider to 'router')."
+            CC.print(Panel(report, title="Provider Router", border_style="cyan"))
+            return True
+
+        elif cmd == "/agents":
+            from src.core.agent_pool import agent_pool
+            CC.print(Panel(agent_pool.report(), title="Sub-Agent Pool", border_style="green"))
+            return True
+
         elif cmd == "/evolve":
             with console.status("[bold purple]Triggering self-evolution...[/bold purple]"):
                 result = memory_core.evolve()
@@ -224,6 +275,7 @@ back     - Return to main menu
                 selected_file = files[choice-1]
                 loaded_hist = memory_core.load_session_from_file(selected_file)
                 self.orchestrator.history = loaded_hist
+                self.orchestrator.history_manager.reset()
                 CC.print(f"[green]Session '{selected_file}' loaded ({len(loaded_hist)} msgs).[/green]")
             except Exception as e:
                 CC.print(f"[red]Load error: {e}[/red]")
@@ -240,6 +292,7 @@ back     - Return to main menu
             return
 
         try:
+            from src.providers.gemini import fetch_available_models
             with console.status("[bold purple]Fetching available models from Google...[/bold purple]"):
                 models = fetch_available_models(self.config.gemini.api_key)
 
@@ -445,6 +498,7 @@ back     - Return to main menu
                 try:
                     user_input = Prompt.ask("[bold purple]USER[/bold purple]")
                 except KeyboardInterrupt:
+                    memory_core.flush()
                     CC.print("\n[yellow]Returning to Menu...[/yellow]")
                     return
 
@@ -452,6 +506,7 @@ back     - Return to main menu
                     continue
 
                 if user_input.lower() in ['exit', 'quit', 'q', '/q']:
+                    await self.shutdown()
                     sys.exit(0)
                 if user_input.lower() in ['back', 'menu', 'b', '/back']:
                     return
@@ -460,9 +515,12 @@ back     - Return to main menu
                     if self.handle_system_command(user_input):
                         continue
 
+                stream_view = StreamView()
+                self.orchestrator.on_stream = stream_view
                 try:
                     task = asyncio.create_task(self.orchestrator.process(user_input))
                     response = await task
+                    stream_view.close()
 
                     if response and response.strip():
                         CC.print(Panel(Markdown(response), border_style="purple"))
@@ -475,7 +533,10 @@ back     - Return to main menu
                         await task
                     except asyncio.CancelledError:
                         pass
+                    memory_core.flush()
                     CC.print("\n[bold red]✋ Stopped.[/bold red]")
+                finally:
+                    stream_view.close()
             except EOFError:
                 return
             except Exception as e:
@@ -495,9 +556,12 @@ back     - Return to main menu
 
                 if choice == 1: await self.chat_loop()
                 elif choice == 2: self.settings_menu()
-                elif choice == 3: sys.exit(0)
+                elif choice == 3:
+                    await self.shutdown()
+                    sys.exit(0)
             except (KeyboardInterrupt, EOFError):
                 CC.print("\n[bold red]Shutdown.[/bold red]")
+                await self.shutdown()
                 sys.exit(0)
 
 def main():
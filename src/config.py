@@ -12,6 +12,8 @@ class MCPServerConfig(BaseModel):
     args: List[str]
     env: Dict[str, str] = Field(default_factory=dict)
     enabled: bool = False
+    # Spawn the server on first tool call; its toolkit comes from the cached tool list until then.
+    lazy: bool = False
     
     def is_executable_available(self) -> bool:
         cmd = self.command
@@ -57,6 +59,65 @@ class AnthropicSettings(BaseModel):
     api_key: Optional[str] = None
     model: str = "claude-sonnet-4.5"
 
+class HTTPSettings(BaseModel):
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    http2: bool = True
+
+class ToolSettings(BaseModel):
+    timeout: float = 120.0
+    io_workers: int = 8
+    cpu_workers: int = 2
+    max_parallel: int = 4
+    command_timeout: float = 120.0
+    cpu_limit_seconds: int = 300
+    # Data-segment limit for execute_command; 0 leaves it unlimited (pip/npm need headroom).
+    memory_limit_mb: int = 0
+    output_head_kb: int = 8
+    output_tail_kb: int = 24
+    stream_output: bool = True
+
+class DelegationSettings(BaseModel):
+    max_agents: int = 4
+    max_steps: int = 20
+    timeout: float = 300.0
+
+class SandboxSettings(BaseModel):
+    image: str = "python:3.11-slim"
+    pool_size: int = 2
+    max_idle: float = 300.0
+    timeout: int = 30
+    mem_limit: str = "512m"
+    tmpfs_size: str = "64m"
+    pids_limit: int = 128
+    output_head_kb: int = 8
+    output_tail_kb: int = 24
+    work_dir: str = "./tmp/workspace"
+
+class RouterSettings(BaseModel):
+    # "provider" or "provider:model", e.g. ["openrouter:openai/gpt-4o-mini", "anthropic", "pollinations"]
+    backends: List[str] = Field(default_factory=lambda: ["pollinations"])
+    hedge: bool = True
+    hedge_after: float = 0.0
+    min_hedge_after: float = 2.0
+    min_samples: int = 5
+    window: int = 50
+    max_error_rate: float = 0.5
+    failures_to_cooldown: int = 3
+    cooldown: float = 30.0
+
+class ResponseCacheSettings(BaseModel):
+    enabled: bool = False
+    modes: List[str] = Field(default_factory=lambda: ["ASK"])
+    ttl_seconds: float = 3600.0
+    max_entries: int = 1000
+    semantic: bool = False
+    semantic_modes: List[str] = Field(default_factory=lambda: ["ASK"])
+    semantic_max_distance: float = 0.15
+
 DEFAULT_MCP_SERVERS = {
     "filesystem": MCPServerConfig(
         command="npx", 
@@ -95,13 +156,23 @@ DEFAULT_MCP_SERVERS = {
 }
 
 class GlobalSettings(BaseModel):
-    provider: Literal["pollinations", "gemini", "openrouter", "openai", "anthropic"] = "pollinations"
+    provider: Literal["pollinations", "gemini", "openrouter", "openai", "anthropic", "router"] = "pollinations"
     max_steps: int = 500
     history_limit: int = 50
+    history_token_budget: int = 24000
+    history_keep_last: int = 6
+    history_digest: Literal["off", "extractive", "llm"] = "extractive"
+    history_digest_provider: Optional[str] = None
+    history_digest_tokens: int = 1500
     log_truncation: bool = True
+    log_fsync: Literal["never", "batch", "event"] = "batch"
+    memory_backend: Literal["sqlite", "journal", "json"] = "sqlite"
     debug_mode: bool = False
     require_approval: bool = False
     mcp_enabled: bool = True
+    mcp_connect_timeout: float = 30.0
+    mcp_max_concurrent_calls: int = 8
+    mcp_schema_token_budget: int = 1200
     mcp_servers: Dict[str, MCPServerConfig] = Field(default_factory=lambda: DEFAULT_MCP_SERVERS)
     allowed_directories: List[str] = Field(
         default_factory=lambda: ["./tmp", "C:/Users/Public"]
@@ -111,6 +182,12 @@ class GlobalSettings(BaseModel):
     openrouter: OpenRouterSettings = Field(default_factory=OpenRouterSettings)
     openai: OpenAISettings = Field(default_factory=OpenAISettings)
     anthropic: AnthropicSettings = Field(default_factory=AnthropicSettings)
+    router: RouterSettings = Field(default_factory=RouterSettings)
+    http: HTTPSettings = Field(default_factory=HTTPSettings)
+    tools: ToolSettings = Field(default_factory=ToolSettings)
+    delegation: DelegationSettings = Field(default_factory=DelegationSettings)
+    sandbox: SandboxSettings = Field(default_factory=SandboxSettings)
+    response_cache: ResponseCacheSettings = Field(default_factory=ResponseCacheSettings)
     mode: str = "BUILD"
     
     def get_mcp_health_report(self) -> Dict[str, Any]:
@@ -142,6 +219,7 @@ class GlobalSettings(BaseModel):
     def save(self):
         with open(CONFIG_PATH, "w") as f:
             json.dump(self.model_dump(), f, indent=4)
+        _remember_settings(self)
 
 MODES = {
     "ASK": {
@@ -184,6 +262,35 @@ def load_config() -> GlobalSettings:
         defaults.save()
         return defaults
 
+_settings_cache: Optional[GlobalSettings] = None
+_settings_stamp: Optional[tuple] = None
+
+def _config_stamp() -> Optional[tuple]:
+    try:
+        st = CONFIG_PATH.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _remember_settings(settings: GlobalSettings):
+    global _settings_cache, _settings_stamp
+    _settings_cache = settings
+    _settings_stamp = _config_stamp()
+
+def reload_config() -> GlobalSettings:
+    settings = load_config()
+    _remember_settings(settings)
+    return settings
+
+def get_settings() -> GlobalSettings:
+    """
+    Process-wide settings. config.json is only re-read and re-validated when
+    its mtime or size changed; GlobalSettings.save() refreshes the cache directly.
+    """
+    if _settings_cache is None or _config_stamp() != _settings_stamp:
+        return reload_config()
+    return _settings_cache
+
 def validate_config(config: GlobalSettings) -> tuple[bool, List[str]]:
     issues = []
     
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Tuple
+from src.core.base_agent import BaseAgent
+
+class AgentPool:
+    """
+    Keeps idle sub-agents warm between delegations, keyed by (variant, role, mode, provider).
+    A leased agent is exclusive to its task; on return only its history is reset, so the
+    role prompt, tool table and precomputed schema are reused. Agents built against an
+    older skill registry version are discarded instead of reused.
+    """
+    def __init__(self, max_idle_per_key: int = 4):
+        self.max_idle_per_key = max_idle_per_key
+        self._idle: Dict[Hashable, List[Tuple[int, BaseAgent]]] = defaultdict(list)
+        self.stats = {"hits": 0, "misses": 0, "discarded": 0}
+
+    def acquire(self, key: Hashable, version: int, factory: Callable[[], BaseAgent]) -> BaseAgent:
+        idle = self._idle[key]
+        while idle:
+            agent_version, agent = idle.pop()
+            if agent_version == version:
+                self.stats["hits"] += 1
+                return agent
+            self.stats["discarded"] += 1
+        self.stats["misses"] += 1
+        agent = factory()
+        agent._pool_version = version
+        return agent
+
+    def release(self, key: Hashable, agent: BaseAgent):
+        agent.reset()
+        idle = self._idle[key]
+        if len(idle) < self.max_idle_per_key:
+            idle.append((getattr(agent, "_pool_version", 0), agent))
+        else:
+            self.stats["discarded"] += 1
+
+    @contextmanager
+    def lease(self, key: Hashable, version: int, factory: Callable[[], BaseAgent]):
+        agent = self.acquire(key, version, factory)
+        try:
+            yield agent
+        finally:
+            self.release(key, agent)
+
+    def report(self) -> str:
+        total = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / total * 100 if total else 0.0
+        idle = sum(len(v) for v in self._idle.values())
+        return (
+            f"Hits: {self.stats['hits']} | Misses: {self.stats['misses']} ({rate:.0f}% reuse)\n"
+            f"Discarded: {self.stats['discarded']} | Idle agents: {idle} across {len([k for k, v in self._idle.items() if v])} keys"
+        )
+
+agent_pool = AgentPool()
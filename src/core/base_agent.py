@@ -1,21 +1,34 @@
 from abc import ABC
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Optional
+from functools import lru_cache
+import asyncio
+import inspect
 import json
 import re
+from contextlib import aclosing
 from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
-from src.core.provider import AIProvider
-from src.tools import TOOL_REGISTRY, get_tools_schema
+from src.core.provider import AIProvider, SystemPrompt
+from src.tools import TOOL_REGISTRY, READ_ONLY_TOOLS, get_tools_schema
 from src.config import GlobalSettings
 from src.core.mcp_manager import MCPManager
-from src.utils import get_system_context, extract_json_from_text
+from src.utils import get_system_context, extract_json_from_text, StreamingJSONParser
 from src.core.memory import memory_core
+from src.core.dispatcher import tool_dispatcher
+from src.core.tool_batch import parse_calls, run_calls, format_observations
+from src.core.history import HistoryManager, active_model
 
 console = Console()
 
+@lru_cache(maxsize=None)
+def _tool_line(name: str, func: Callable) -> str:
+    sig = str(inspect.signature(func)).replace(" -> str", "")
+    doc = inspect.getdoc(func) or "Tool."
+    return f"- {name}{sig}: {doc}"
+
 class BaseAgent(ABC):
-    def __init__(self, name: str, provider: AIProvider, skill_name: str, settings: GlobalSettings):
+    def __init__(self, name: str, provider: AIProvider, skill_name: str, settings: GlobalSettings, mcp: Optional[MCPManager] = None):
         self.name = name
         self.provider = provider
         self.skill_name = skill_name
@@ -23,8 +36,23 @@ class BaseAgent(ABC):
         self.system_prompt = "You are a ZervGen Agent."
         self.tools: Dict[str, Callable] = {}
         self.history: List[Dict] = []
-        self.mcp = MCPManager(self.settings) if self.settings.mcp_enabled else None
+        self.history_manager = HistoryManager(settings)
+        # MCP connections are owned by the caller and shared; agents never spawn their own servers.
+        self.mcp = mcp
         self.mcp_initialized = False
+        self.max_steps = 20
+        self._static_prompt = (None, "")
+
+    def reset(self):
+        """Clears per-task state so a pooled agent can take the next task."""
+        self.history = []
+        self.history_manager.reset()
+
+    def attach_mcp(self, mcp: Optional[MCPManager]):
+        """Points a pooled agent at the caller's leased MCP manager."""
+        if mcp is not self.mcp:
+            self.mcp = mcp
+            self.mcp_initialized = False
 
     async def _ensure_mcp(self):
         if self.mcp and not self.mcp_initialized:
@@ -40,38 +68,59 @@ class BaseAgent(ABC):
                 self.tools[name] = TOOL_REGISTRY[name]
 
     def _trim_history(self):
-            limit = max(self.settings.history_limit, 50)
-            if len(self.history) > limit + 1:
-                self.history = [self.history[0]] + self.history[-limit:]
-
-    async def run(self, task: str) -> str:
-        # await self._ensure_mcp()
-
-        if self.system_prompt == "You are a ZervGen Agent." and self.settings.debug_mode:
-            console.print(f"[yellow]⚠️ Warning: Agent {self.name} has default prompt.[/yellow]")
-
-        self.history.append({"role": "user", "content": f"TASK: {task}"})
-        memory_core.log_event(f"agent:{self.name}", f"Started task: {task}", "subtask_start")
-        step = 0
-        last_json = None
-        context = get_system_context()
-        memories = memory_core.get_recent_memories(limit=5)
-        
-        allowed_tools_schema = []
-        for name, func in self.tools.items():
-            import inspect
-            sig = str(inspect.signature(func)).replace(" -> str", "")
-            doc = inspect.getdoc(func) or "Tool."
-            allowed_tools_schema.append(f"- {name}{sig}: {doc}")
-        
-        local_desc = "\n".join(allowed_tools_schema)
+        self.history, _ = self.history_manager.fit(self.history)
+
+    def _has_tool(self, tool_name: str) -> bool:
+        return tool_name in self.tools or bool(self.mcp_initialized and tool_name in self.mcp.tools_map)
+
+    async def _execute_tool(self, tool_name: str, args: dict):
+        # Only the agent's own tool table: role filters (e.g. no delegation inside a fan-out) hold here.
+        if tool_name in self.tools:
+            return await tool_dispatcher.run(tool_name, self.tools[tool_name], args)
+        elif self.mcp_initialized and tool_name in self.mcp.tools_map:
+            return await self.mcp.execute_tool(tool_name, args)
+        return f"Error: Tool '{tool_name}' not found or permission denied for agent '{self.name}'."
+
+    async def _stream_step(self, full_prompt: str):
+        """Streams one completion; read-only tools start as soon as their args close."""
+        response_text = ""
+        parser = StreamingJSONParser()
+        early = None
+        title_shown = False
+        try:
+            async with aclosing(self.provider.stream_text(self.history, full_prompt)) as stream:
+                async for delta in stream:
+                    response_text += delta
+                    parser.feed(delta)
+
+                    tool_name = parser.get("tool")
+                    args = parser.get("args")
+                    if early is None and tool_name in READ_ONLY_TOOLS and self._has_tool(tool_name) and isinstance(args, dict):
+                        early = {"tool": tool_name, "args": args, "task": asyncio.create_task(self._execute_tool(tool_name, args))}
+
+                    if not title_shown and not self.settings.debug_mode and parser.has("title"):
+                        console.print(f"[dim magenta]  ↳ [{self.name}] {parser.get('title')}[/dim magenta]")
+                        title_shown = True
+
+                    if parser.complete:
+                        break
+        except BaseException:
+            if early: early["task"].cancel()
+            raise
+        return response_text, early, title_shown
+
+    def _build_static_prompt(self) -> str:
+        """Prompt prefix (role, toolkit, protocol); rebuilt only when the prompt or tool set changes."""
+        self.mcp_initialized = bool(self.mcp and self.mcp.tools_map)
         mcp_desc = self.mcp.get_tools_schema() if self.mcp_initialized else "None"
-        all_tools = f"{local_desc}\n\n--- MCP TOOLS ---\n{mcp_desc}" if mcp_desc else local_desc
+        key = (self.system_prompt, tuple(self.tools), mcp_desc)
+        if self._static_prompt[0] == key:
+            return self._static_prompt[1]
 
-        full_prompt = (
-            f"{context}\n\n"
+        local_desc = "\n".join(_tool_line(name, func) for name, func in self.tools.items())
+        all_tools = f"{local_desc}\n\n--- MCP TOOLS ---\n{mcp_desc}" if mcp_desc else local_desc
+        static_prompt = (
             f"{self.system_prompt}\n\n"
-            f"--- MEMORY ---\n{memories}\n\n"
             f"--- TOOLKIT ---\n{all_tools}\n\n"
             f"--- PROTOCOL ---\n"
             f"1. THOUGHT: Plan step-by-step in 'thoughts' array.\n"
@@ -82,16 +131,37 @@ class BaseAgent(ABC):
             f"  \"tool\": \"tool_name\",\n"
             f"  \"args\": {{ \"arg\": \"val\" }}\n"
             f"}}\n"
-            f"4. FINAL: Use 'response' tool to finish."
+            f"   For independent actions (e.g. reading several files), replace 'tool'/'args' with\n"
+            f"   \"calls\": [{{ \"tool\": \"...\", \"args\": {{...}} }}, ...]. They run in parallel; results return in order.\n"
+            f"4. FINAL: Use 'response' tool (alone) to finish."
         )
+        self._static_prompt = (key, static_prompt)
+        return static_prompt
 
-        for _ in range(20):
+    async def run(self, task: str) -> str:
+        # await self._ensure_mcp()
+
+        if self.system_prompt == "You are a ZervGen Agent." and self.settings.debug_mode:
+            console.print(f"[yellow]⚠️ Warning: Agent {self.name} has default prompt.[/yellow]")
+
+        self.history.append({"role": "user", "content": f"TASK: {task}"})
+        memory_core.log_event(f"agent:{self.name}", f"Started task: {task}", "subtask_start")
+        step = 0
+        last_json = None
+        context = get_system_context()
+        memories = memory_core.get_recent_memories(limit=5)
+        
+        full_prompt = SystemPrompt(self._build_static_prompt(), f"{context}\n\n--- MEMORY ---\n{memories}")
+
+        for _ in range(self.max_steps):
             self._trim_history()
             
             try:
-                response_text = await self.provider.generate_text(self.history, full_prompt)
+                response_text, early, title_shown = await self._stream_step(full_prompt)
                 from src.utils import print_token_usage
-                print_token_usage(self.history + [{"content": full_prompt}], response_text)
+                request, usage = self.history + [{"content": full_prompt}], self.provider.last_usage
+                self.history_manager.record_usage(request, usage)
+                print_token_usage(request, response_text, usage, active_model(self.settings))
             except Exception as e:
                 error_msg = f"Agent Brain Error: {e}"
                 memory_core.log_event(f"agent:{self.name}", error_msg, "error")
@@ -99,7 +169,11 @@ class BaseAgent(ABC):
 
             json_str = extract_json_from_text(response_text)
 
+            if early and not json_str:
+                early["task"].cancel()
+
             if json_str and json_str == last_json:
+                if early: early["task"].cancel()
                 self.history.append({"role": "user", "content": "SYSTEM: Loop detected. Change arguments."})
                 step += 1
                 continue
@@ -116,12 +190,25 @@ class BaseAgent(ABC):
                 title = data.get("title", "Working...")
                 tool_name = data.get("tool")
                 args = data.get("args", {})
+                calls = parse_calls(data) if not tool_name else None
+
+                if early and (early["tool"], early["args"]) != (tool_name, args):
+                    early["task"].cancel()
+                    early = None
 
                 if self.settings.debug_mode:
                     thought_text = "\n".join([f"- {t}" for t in thoughts])
                     console.print(Panel(thought_text, title=f"[dim]🧠 [{self.name}] {title}[/dim]", border_style="dim magenta"))
-                else:
+                elif not title_shown:
                     console.print(f"[dim magenta]  ↳ [{self.name}] {title}[/dim magenta]")
+
+                if calls:
+                    results = await run_calls(calls, self._execute_tool, self.settings.tools.max_parallel)
+                    self.history.append({"role": "assistant", "content": json_str})
+                    observed = self.history_manager.observe(self.history, calls, results, 4000)
+                    self.history.append({"role": "user", "content": f"TOOL RESULTS:\n{format_observations(calls, observed, None)}"})
+                    memory_core.log_event(f"agent:{self.name}", {"calls": [c[0] for c in calls], "results": results}, "tool_execution")
+                    continue
                 
                 if tool_name == "response" or tool_name is None:
                     final_text = args.get("text") or args.get("content") or args.get("answer") or args.get("response")
@@ -134,23 +221,14 @@ class BaseAgent(ABC):
                 result = ""
 
                 # --- TOOL DISPATCHER ---
-                if tool_name in TOOL_REGISTRY:
-                    import inspect
-                    func = TOOL_REGISTRY[tool_name]
-                    if inspect.iscoroutinefunction(func):
-                        result = await func(**args)
-                    else:
-                        result = func(**args)
-                elif self.mcp_initialized and tool_name in self.mcp.tools_map:
-                    result = await self.mcp.execute_tool(tool_name, args)
+                if early:
+                    result = await early["task"]
                 else:
-                    result = f"Error: Tool {tool_name} not found."
-
-                if len(str(result)) > 4000:
-                    result = str(result)[:4000] + "... [TRUNCATED]"
+                    result = await self._execute_tool(tool_name, args)
 
+                observed = self.history_manager.observe(self.history, [(tool_name, args)], [result], 4000)[0]
                 self.history.append({"role": "assistant", "content": json_str})
-                self.history.append({"role": "user", "content": f"TOOL RESULT: {result}"})
+                self.history.append({"role": "user", "content": f"TOOL RESULT: {observed}"})
                 
                 memory_core.log_event(f"agent:{self.name}", {"tool": tool_name, "result": result}, "tool_execution")
                 
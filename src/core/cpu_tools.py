@@ -0,0 +1,32 @@
+import ast
+
+# Process-pool entry points for "cpu" tools. Workers unpickle these by module path, so this
+# module must stay stdlib-only with no import-time side effects (no config, memory or tools).
+
+def code_skeleton(path: str, **kwargs) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+
+        skeleton = []
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ClassDef):
+                skeleton.append(f"\n[Line {node.lineno}] class {node.name}:")
+                for item in node.body:
+                    if isinstance(item, ast.FunctionDef):
+                        args = [a.arg for a in item.args.args]
+                        skeleton.append(f"    [Line {item.lineno}] def {item.name}({', '.join(args)}): ...")
+            elif isinstance(node, ast.FunctionDef):
+                if not isinstance(getattr(node, "parent", None), ast.ClassDef):
+                    if node.col_offset == 0:
+                        args = [a.arg for a in node.args.args]
+                        skeleton.append(f"[Line {node.lineno}] def {node.name}({', '.join(args)}): ...")
+        return "\n".join(skeleton) if skeleton else "No structure found (script or empty)."
+    except Exception as e:
+        return f"Skeleton Error: {e}"
+
+# Tool name -> process-pool entry point.
+CPU_TASKS = {
+    "get_code_skeleton": code_skeleton,
+}
@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from src.config import ToolSettings
+
+def _call(func: Callable, args: dict) -> Any:
+    """Executor entry point. Coroutine tools get a private event loop inside the worker."""
+    if inspect.iscoroutinefunction(func):
+        return asyncio.run(func(**args))
+    return func(**args)
+
+class ToolDispatcher:
+    """
+    Runs a tool according to its execution class:
+      - "async": awaited on the event loop (non-blocking tools, tools bound to loop resources)
+      - "io":    blocking file/subprocess work, on a thread pool
+      - "cpu":   parsing/analysis, on a process pool (falls back to threads if it cannot start).
+                 Workers run the tool's entry in src/core/cpu_tools.py, never src.tools itself.
+    Each call is bounded by a per-tool timeout; on expiry the caller gets an error string
+    while the worker finishes in the background.
+    """
+    def __init__(self, settings: Optional[ToolSettings] = None):
+        self.settings = settings
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self.stats = {"async": 0, "io": 0, "cpu": 0, "timeouts": 0}
+
+    def _settings(self) -> ToolSettings:
+        if self.settings is None:
+            from src.config import get_settings
+            self.settings = get_settings().tools
+        return self.settings
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self._settings().io_workers, thread_name_prefix="tool-io")
+        return self._threads
+
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._processes is None:
+            try:
+                self._processes = ProcessPoolExecutor(max_workers=self._settings().cpu_workers)
+            except Exception:
+                return None
+        return self._processes
+
+    def kind(self, name: str, func: Callable) -> str:
+        from src.tools import TOOL_PROFILES
+        default = "async" if inspect.iscoroutinefunction(func) else "io"
+        return TOOL_PROFILES.get(name, (default, None))[0]
+
+    def timeout(self, name: str) -> Optional[float]:
+        from src.tools import TOOL_PROFILES
+        if name in TOOL_PROFILES:
+            timeout = TOOL_PROFILES[name][1]
+            return None if timeout == 0 else (timeout or self._settings().timeout)
+        return self._settings().timeout
+
+    async def _submit(self, kind: str, name: str, func: Callable, args: dict) -> Any:
+        loop = asyncio.get_running_loop()
+        if kind == "async":
+            return await func(**args)
+        if kind == "cpu":
+            from src.core.cpu_tools import CPU_TASKS
+            entry = CPU_TASKS.get(name)
+            pool = self._process_pool() if entry else None
+            if pool is not None:
+                try:
+                    return await loop.run_in_executor(pool, functools.partial(entry, **args))
+                except BrokenProcessPool:
+                    self._processes = None
+        return await loop.run_in_executor(self._thread_pool(), _call, func, args)
+
+    async def run(self, name: str, func: Callable, args: Dict[str, Any]) -> Any:
+        kind = self.kind(name, func)
+        if kind == "async" and not inspect.iscoroutinefunction(func):
+            kind = "io"
+        self.stats[kind] += 1
+
+        timeout = self.timeout(name)
+        try:
+            return await asyncio.wait_for(self._submit(kind, name, func, args), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return f"Error: Tool '{name}' timed out after {timeout:g}s."
+
+    def shutdown(self):
+        if self._threads:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        if self._processes:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+tool_dispatcher = ToolDispatcher()
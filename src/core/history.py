@@ -0,0 +1,376 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from importlib.util import find_spec
+from typing import Dict, List, Optional, Set, Tuple
+from src.config import GlobalSettings
+from src.core.observations import ObservationStore
+
+TIKTOKEN_AVAILABLE = find_spec("tiktoken") is not None
+
+# Context windows by model-name prefix (tokens). Unknown models fall back to DEFAULT_CONTEXT.
+MODEL_CONTEXT = {
+    "gpt-5": 400000, "gpt-4.1": 1000000, "gpt-4o": 128000, "o3": 200000, "o4": 200000,
+    "claude": 200000, "gemini": 1000000, "google/gemini": 1000000,
+    "openai": 128000, "mistral": 32000, "allenai/": 32000,
+}
+DEFAULT_CONTEXT = 32000
+
+# History messages that carry tool output; these are compacted before anything is dropped.
+OBSERVATION_PREFIXES = ("OBSERVATION", "TOOL RESULT")
+DIGEST_PREFIX = "SESSION DIGEST"
+PATH_ARGS = ("path", "paths", "file_path", "filename", "directory")
+
+DIGEST_PROMPT = (
+    "Summarize these earlier turns of an agent session for the agent itself. "
+    "Terse bullet points only: files read or changed (with paths), facts learned, "
+    "decisions made, commands run and their outcome, errors hit, and what remains to do. "
+    "Under 150 words. No preamble."
+)
+
+def _encoding_name(model: str) -> str:
+    """tiktoken encoding for a model id; "vendor/model" ids (OpenRouter) are matched on the model part."""
+    name = model.split("/")[-1]
+    return "o200k_base" if name.startswith(("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")) else "cl100k_base"
+
+class TokenCounter:
+    """
+    Token counts per text, cached by content so a message is tokenized once no matter
+    how many steps it stays in history. OpenAI models use their own tiktoken encoding;
+    other models (Claude, Gemini, open models) are approximated with cl100k_base, or
+    ~4 chars/token without tiktoken. Counts are scaled by a ratio calibrated against the
+    input tokens providers report (calibrate()), so approximate tokenizers converge on
+    the real figure after a few calls.
+    """
+    def __init__(self, model: Optional[str] = None, max_entries: int = 8192):
+        self.model = model or ""
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._encoding = None
+        self.scale = 1.0
+        self.calibrated = False
+        if TIKTOKEN_AVAILABLE:
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model.split("/")[-1])
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding(_encoding_name(self.model))
+            except Exception:
+                self._encoding = None
+        self.exact = self._encoding is not None
+
+    def raw_count(self, text) -> int:
+        """Tokens by the local tokenizer, before calibration."""
+        text = text if isinstance(text, str) else str(text)
+        key = (len(text), hash(text))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        if self._encoding is not None:
+            tokens = len(self._encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = (len(text) + 3) // 4
+        self._cache[key] = tokens
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens
+
+    def count(self, text) -> int:
+        tokens = self.raw_count(text)
+        return tokens if self.scale == 1.0 else round(tokens * self.scale)
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        # ~4 tokens of framing per message in chat formats.
+        return sum(self.count(m.get("content", "")) + 4 for m in messages)
+
+    def calibrate(self, messages: List[Dict], reported_input: int):
+        """Moves the scale toward provider-reported input tokens for a request made of `messages`."""
+        estimated = sum(self.raw_count(m.get("content", "")) + 4 for m in messages)
+        if estimated <= 0 or reported_input <= 0:
+            return
+        ratio = min(max(reported_input / estimated, 0.5), 2.0)
+        self.scale = ratio if not self.calibrated else self.scale * 0.7 + ratio * 0.3
+        self.calibrated = True
+
+_counters: Dict[str, TokenCounter] = {}
+
+def get_counter(model: Optional[str] = None) -> TokenCounter:
+    key = model or ""
+    if key not in _counters:
+        _counters[key] = TokenCounter(key)
+    return _counters[key]
+
+def _provider_model(settings: GlobalSettings, name: str) -> str:
+    provider_settings = getattr(settings, name, None)
+    return getattr(provider_settings, "model", None) or getattr(provider_settings, "text_model", "") or ""
+
+def active_model(settings: GlobalSettings) -> str:
+    if settings.provider == "router":
+        # Any backend may serve the call, so size history for the smallest context window.
+        models = []
+        for spec in settings.router.backends:
+            name, _, model = spec.partition(":")
+            models.append(model or _provider_model(settings, name))
+        return min(models, key=context_window, default="")
+    return _provider_model(settings, settings.provider)
+
+def context_window(model: str) -> int:
+    for prefix in sorted(MODEL_CONTEXT, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT[prefix]
+    return DEFAULT_CONTEXT
+
+def history_budget(settings: GlobalSettings) -> int:
+    """Tokens available for history: the configured budget, capped at half the model's window."""
+    return min(settings.history_token_budget, context_window(active_model(settings)) // 2)
+
+def is_observation(message: Dict) -> bool:
+    return message.get("role") == "user" and str(message.get("content", "")).startswith(OBSERVATION_PREFIXES)
+
+def is_digest(message: Dict) -> bool:
+    return str(message.get("content", "")).startswith(DIGEST_PREFIX)
+
+def compact_observation(content: str, keep_chars: int = 400) -> str:
+    if len(content) <= keep_chars + 80:
+        return content
+    return f"{content[:keep_chars]}\n... [compacted: {len(content) - keep_chars} chars of old tool output removed]"
+
+def _one_line(text, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _segment_key(messages: List[Dict]) -> str:
+    raw = json.dumps([(m.get("role"), str(m.get("content", ""))) for m in messages], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _touched_paths(args) -> List[str]:
+    if not isinstance(args, dict):
+        return []
+    paths = []
+    for key in PATH_ARGS:
+        value = args.get(key)
+        if isinstance(value, str):
+            paths.append(value)
+        elif isinstance(value, list):
+            paths.extend(v for v in value if isinstance(v, str))
+    return paths
+
+def extractive_digest(messages: List[Dict], files: Optional[Dict[str, str]] = None) -> str:
+    """
+    One line per step of an evicted segment: the action taken and the first line of its
+    outcome. Paths seen in tool arguments are recorded in `files` (path -> last tool).
+    """
+    lines = []
+    for message in messages:
+        content = str(message.get("content", ""))
+        if message.get("role") == "assistant":
+            try:
+                data = json.loads(content)
+            except Exception:
+                data = None
+            if not isinstance(data, dict):
+                lines.append(f"- said: {_one_line(content, 160)}")
+                continue
+            calls = data.get("calls") if isinstance(data.get("calls"), list) else [data]
+            actions = []
+            for call in calls:
+                if not isinstance(call, dict) or not call.get("tool"):
+                    continue
+                tool, args = call["tool"], call.get("args", {})
+                if tool == "response":
+                    actions.append(f"answered: {_one_line((args or {}).get('text', '') if isinstance(args, dict) else args, 160)}")
+                    continue
+                for path in _touched_paths(args):
+                    if files is not None:
+                        files[path] = tool
+                actions.append(f"{tool}({_one_line(json.dumps(args, ensure_ascii=False), 100)})")
+            if actions:
+                title = data.get("title")
+                lines.append(f"- {title + ': ' if title else ''}{'; '.join(actions)}")
+        elif is_observation(message):
+            body = content.split(":", 1)[-1].strip()
+            lines.append(f"  -> {_one_line(body.split(chr(10))[0], 140)} ({len(body)} chars)")
+        elif is_digest(message):
+            continue
+        else:
+            lines.append(f"- {message.get('role', 'user')}: {_one_line(content, 200)}")
+    return "\n".join(lines)
+
+_segment_cache: "OrderedDict[str, str]" = OrderedDict()
+SEGMENT_CACHE_SIZE = 256
+
+def _cache_segment(key: str, summary: str):
+    _segment_cache[key] = summary
+    _segment_cache.move_to_end(key)
+    while len(_segment_cache) > SEGMENT_CACHE_SIZE:
+        _segment_cache.popitem(last=False)
+
+class SessionDigest:
+    """
+    Rolling summary of turns evicted from history, kept as a single message right after
+    history[0] so the agent remembers what it already read and did. Each evicted segment
+    is summarized extractively at once; in "llm" mode a model summary is produced in a
+    background task and swapped in when ready. Summaries are cached per segment hash.
+    """
+    def __init__(self, settings: GlobalSettings):
+        self.settings = settings
+        self.segments: List[Tuple[str, str]] = []
+        self.files: Dict[str, str] = {}
+        self.steps = 0
+        self.dirty = False
+        self._provider = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, messages: List[Dict]):
+        key = _segment_key(messages)
+        # Files are always collected extractively, even when a cached LLM summary is used.
+        extractive = extractive_digest(messages, self.files)
+        summary = _segment_cache.get(key)
+        if summary is None:
+            summary = extractive
+            if self.settings.history_digest == "llm":
+                self._summarize_later(key, messages)
+        self.segments.append((key, summary))
+        self.steps += sum(1 for m in messages if m.get("role") == "assistant")
+        self.dirty = True
+
+    def _summarize_later(self, key: str, messages: List[Dict]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._summarize(key, messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, key: str, messages: List[Dict]):
+        try:
+            if self._provider is None:
+                from src.providers.factory import build_provider
+                # A separate instance, so the agent's provider state (usage, caches) is untouched.
+                self._provider = build_provider(self.settings, self.settings.history_digest_provider)
+            transcript = "\n".join(f"{m.get('role')}: {str(m.get('content', ''))[:1500]}" for m in messages if not is_digest(m))
+            summary = (await self._provider.generate_text([{"role": "user", "content": transcript}], DIGEST_PROMPT)).strip()
+        except Exception:
+            return
+        if not summary:
+            return
+        _cache_segment(key, summary)
+        self.segments = [(k, summary if k == key else s) for k, s in self.segments]
+        self.dirty = True
+
+    def render(self, counter: "TokenCounter", budget: int) -> str:
+        """The digest message, newest segments kept first when over `budget` tokens."""
+        self.dirty = False
+        header = f"{DIGEST_PREFIX} ({self.steps} earlier steps summarized; this work is done, do not redo it):"
+        files = ""
+        if self.files:
+            files = "Files touched: " + ", ".join(f"{p} ({t})" for p, t in list(self.files.items())[-40:])
+        used = counter.count(header) + counter.count(files)
+        kept = []
+        for _, summary in reversed(self.segments):
+            cost = counter.count(summary)
+            if used + cost > budget and kept:
+                break
+            kept.append(summary)
+            used += cost
+        omitted = len(self.segments) - len(kept)
+        parts = [header] + ([files] if files else [])
+        if omitted:
+            parts.append(f"({omitted} older segments omitted)")
+        return "\n".join(parts + list(reversed(kept)))
+
+    def reset(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        self.segments, self.files, self.steps, self.dirty = [], {}, 0, False
+
+class HistoryManager:
+    """
+    Keeps a conversation within a token budget. history[0] (the task / first user turn)
+    and the last `keep_last` messages are never touched. Over budget, the oldest tool
+    observations are compacted first; if that is not enough, the oldest messages are
+    evicted and folded into a session digest message that is pinned after history[0].
+    """
+    def __init__(self, settings: GlobalSettings, keep_last: Optional[int] = None):
+        self.settings = settings
+        self.keep_last = keep_last if keep_last is not None else settings.history_keep_last
+        self.digest = SessionDigest(settings) if settings.history_digest != "off" else None
+        self.observations = ObservationStore()
+        self.stats = {"compacted": 0, "dropped": 0}
+
+    @property
+    def counter(self) -> TokenCounter:
+        # Resolved per call: /provider and /model switches change the tokenizer and window.
+        return get_counter(active_model(self.settings))
+
+    def fit(self, history: List[Dict], budget: Optional[int] = None) -> Tuple[List[Dict], List[Dict]]:
+        budget = budget or history_budget(self.settings)
+        max_messages = max(self.settings.history_limit, 50)
+        counter = self.counter
+        pinned = 2 if len(history) > 1 and is_digest(history[1]) else 1
+        if pinned == 2 and self.digest and self.digest.dirty:
+            history = [history[0], self._digest_message(counter)] + history[2:]
+
+        total = counter.count_messages(history)
+        if total <= budget and len(history) <= max_messages + pinned:
+            return history, []
+
+        history = list(history)
+        protected_from = max(pinned, len(history) - self.keep_last)
+
+        for i in range(pinned, protected_from):
+            if total <= budget:
+                break
+            message = history[i]
+            if is_observation(message):
+                compacted = compact_observation(str(message["content"]))
+                if compacted != message["content"]:
+                    total -= counter.count(message["content"]) - counter.count(compacted)
+                    history[i] = {**message, "content": compacted}
+                    self.stats["compacted"] += 1
+
+        if total > budget:
+            # Evict down to a low-water mark so segments are summarized in chunks, not one step
+            # at a time; room for a new digest is reserved so adding it cannot re-trigger eviction.
+            budget = budget * 3 // 4
+            if self.digest and pinned == 1:
+                budget -= self.settings.history_digest_tokens
+        evicted = []
+        while len(history) > self.keep_last + pinned and (total > budget or len(history) > max_messages + pinned):
+            message = history.pop(pinned)
+            total -= counter.count(message.get("content", "")) + 4
+            evicted.append(message)
+        # Never split a tool call from its result.
+        if evicted and len(history) > self.keep_last + pinned and is_observation(history[pinned]):
+            evicted.append(history.pop(pinned))
+        self.stats["dropped"] += len(evicted)
+
+        if evicted and self.digest:
+            self.digest.add(evicted)
+            history = [history[0], self._digest_message(counter)] + history[pinned:]
+        return history, evicted
+
+    def _digest_message(self, counter: TokenCounter) -> Dict:
+        return {"role": "user", "content": self.digest.render(counter, self.settings.history_digest_tokens)}
+
+    def observe(self, history: List[Dict], calls: List[Tuple[str, dict]], results: List, max_chars: int) -> List[str]:
+        """History text for each tool result: tagged, deduplicated against earlier observations, truncated."""
+        return [self.observations.record(history, name, args, result, max_chars) for (name, args), result in zip(calls, results)]
+
+    def record_usage(self, request: List[Dict], usage: Optional[Dict]):
+        """Calibrates the token counter with the input tokens the provider reported for `request`."""
+        if not usage or usage.get("input_tokens") is None:
+            return
+        reported = usage["input_tokens"] + (usage.get("cache_read_input_tokens") or 0) + (usage.get("cache_creation_input_tokens") or 0)
+        self.counter.calibrate(request, reported)
+
+    def reset(self):
+        self.observations.reset()
+        if self.digest:
+            self.digest.reset()
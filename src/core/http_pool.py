@@ -0,0 +1,49 @@
+import httpx
+import json
+from importlib.util import find_spec
+from typing import Dict, Optional, AsyncIterator
+from src.config import HTTPSettings
+
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+def get_client(name: str, settings: Optional[HTTPSettings] = None) -> httpx.AsyncClient:
+    """Returns the long-lived keep-alive client for `name`, creating it on first use."""
+    client = _clients.get(name)
+    if client is not None and not client.is_closed:
+        return client
+
+    settings = settings or HTTPSettings()
+    client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.timeout, connect=settings.connect_timeout),
+        http2=settings.http2 and HTTP2_AVAILABLE
+    )
+    _clients[name] = client
+    return client
+
+async def close_all():
+    for client in list(_clients.values()):
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+    _clients.clear()
+
+async def iter_sse_json(response: httpx.Response) -> AsyncIterator[dict]:
+    """Parses `data:` lines of a server-sent event stream into JSON objects."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
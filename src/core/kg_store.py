@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+class KGStore(ABC):
+    """Persistence backend for knowledge-graph facts (dicts with id/timestamp/content/category)."""
+
+    @abstractmethod
+    def load(self) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def add(self, fact: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def add_many(self, facts: List[Dict[str, Any]]):
+        """Stores all facts or none of them."""
+        pass
+
+    @abstractmethod
+    def replace_all(self, facts: List[Dict[str, Any]]):
+        pass
+
+    def close(self):
+        pass
+
+def _atomic_write_json(path: Path, data: Any):
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class JSONKGStore(KGStore):
+    """Legacy single-file store. Every change rewrites the whole file (atomically)."""
+    def __init__(self, path: Path):
+        self.path = path
+        self.facts: List[Dict[str, Any]] = []
+
+    def load(self) -> List[Dict[str, Any]]:
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.facts = list(json.load(f).get("facts", []))
+            except Exception:
+                self.facts = []
+        return list(self.facts)
+
+    def add(self, fact: Dict[str, Any]):
+        self.add_many([fact])
+
+    def add_many(self, facts: List[Dict[str, Any]]):
+        self.facts.extend(facts)
+        _atomic_write_json(self.path, {"facts": self.facts})
+
+    def replace_all(self, facts: List[Dict[str, Any]]):
+        self.facts = list(facts)
+        _atomic_write_json(self.path, {"facts": self.facts})
+
+class JournalKGStore(KGStore):
+    """
+    Snapshot + append-only journal. Inserts append one line; the journal is
+    folded into the snapshot once it grows past `compact_after` entries.
+    A torn last line from a crash is skipped on replay.
+    """
+    def __init__(self, snapshot_path: Path, journal_path: Path, compact_after: int = 5000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_after = compact_after
+        self.facts: List[Dict[str, Any]] = []
+        self.journal_entries = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> List[Dict[str, Any]]:
+        facts = []
+        if self.snapshot_path.exists():
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    facts = list(json.load(f).get("facts", []))
+            except Exception:
+                facts = []
+
+        self.journal_entries = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        facts.append(json.loads(line))
+                        self.journal_entries += 1
+                    except json.JSONDecodeError:
+                        continue
+
+        self.facts = facts
+        if self.journal_entries >= self.compact_after:
+            self.compact()
+        return list(self.facts)
+
+    def add(self, fact: Dict[str, Any]):
+        self.add_many([fact])
+
+    def add_many(self, facts: List[Dict[str, Any]]):
+        payload = "".join(json.dumps(fact, ensure_ascii=False) + "\n" for fact in facts)
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.facts.extend(facts)
+            self.journal_entries += len(facts)
+        if self.journal_entries >= self.compact_after:
+            self.compact()
+
+    def replace_all(self, facts: List[Dict[str, Any]]):
+        with self._lock:
+            self.facts = list(facts)
+        self.compact()
+
+    def compact(self):
+        with self._lock:
+            _atomic_write_json(self.snapshot_path, {"facts": self.facts})
+            open(self.journal_path, "w", encoding="utf-8").close()
+            self.journal_entries = 0
+
+class SQLiteKGStore(KGStore):
+    """SQLite in WAL mode: O(1) inserts and transactional batches."""
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS facts ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, timestamp REAL, "
+            "content TEXT, category TEXT, extra TEXT)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _row(fact: Dict[str, Any]) -> tuple:
+        extra = {k: v for k, v in fact.items() if k not in ("id", "timestamp", "content", "category")}
+        return (
+            fact.get("id"), fact.get("timestamp"), fact.get("content"),
+            fact.get("category"), json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute("SELECT id, timestamp, content, category, extra FROM facts ORDER BY seq").fetchall()
+        facts = []
+        for fact_id, timestamp, content, category, extra in rows:
+            fact = {"id": fact_id, "timestamp": timestamp, "content": content, "category": category}
+            if extra:
+                fact.update(json.loads(extra))
+            facts.append(fact)
+        return facts
+
+    def add(self, fact: Dict[str, Any]):
+        self.add_many([fact])
+
+    def add_many(self, facts: List[Dict[str, Any]]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO facts (id, timestamp, content, category, extra) VALUES (?, ?, ?, ?, ?)",
+                [self._row(fact) for fact in facts]
+            )
+
+    def replace_all(self, facts: List[Dict[str, Any]]):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM facts")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO facts (id, timestamp, content, category, extra) VALUES (?, ?, ?, ?, ?)",
+                [self._row(fact) for fact in facts]
+            )
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+
+def open_kg_store(backend: str, memory_dir: Path) -> Tuple[KGStore, List[Dict[str, Any]]]:
+    """
+    Opens the configured backend and returns it with its facts, loaded once. A legacy
+    knowledge_graph.json is migrated into a new, empty backend on the way.
+    """
+    legacy_file = memory_dir / "knowledge_graph.json"
+    if backend == "json":
+        store = JSONKGStore(legacy_file)
+        return store, store.load()
+
+    if backend == "journal":
+        store = JournalKGStore(memory_dir / "knowledge_graph.snapshot.json", memory_dir / "knowledge_graph.journal.jsonl")
+    else:
+        store = SQLiteKGStore(memory_dir / "knowledge_graph.db")
+
+    facts = store.load()
+    if legacy_file.exists() and not facts:
+        facts = JSONKGStore(legacy_file).load()
+        if facts:
+            store.add_many(facts)
+            print(f"[Memory] Migrated {len(facts)} facts from {legacy_file.name} to '{backend}' store.")
+        os.replace(legacy_file, legacy_file.with_suffix(".json.migrated"))
+    return store, facts
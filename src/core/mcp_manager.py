@@ -1,108 +1,437 @@
 import asyncio
+import json
 import shutil
 import os
-from contextlib import AsyncExitStack
-from typing import Dict, Any, List
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from src.config import GlobalSettings
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from src.config import GlobalSettings, MCPServerConfig
 from src.core.memory import memory_core
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+CACHE_DIR = Path("tmp") / "cache"
+TOOLS_CACHE_FILE = CACHE_DIR / "mcp_tools.json"
+
+def _tool_def(tool) -> Dict[str, Any]:
+    """Plain-dict tool definition, independent of the mcp SDK's model field names."""
+    data = tool.model_dump(by_alias=True, exclude_none=True) if hasattr(tool, "model_dump") else dict(tool)
+    return {
+        "name": data.get("name"),
+        "description": data.get("description") or "",
+        "inputSchema": data.get("inputSchema") or data.get("input_schema") or {}
+    }
+
+def _cache_key(cfg: MCPServerConfig) -> str:
+    return json.dumps([cfg.command, cfg.args])
+
+def _is_transport_error(error: BaseException) -> bool:
+    """True when the stdio channel to the server broke, as opposed to an error the server returned."""
+    if isinstance(error, BaseExceptionGroup):
+        return any(_is_transport_error(e) for e in error.exceptions)
+    try:
+        import anyio
+        if isinstance(error, (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(error, (ConnectionError, EOFError))
+
+def _server_version(init_result) -> str:
+    info = getattr(init_result, "serverInfo", None) or getattr(init_result, "server_info", None)
+    return str(getattr(info, "version", "") or "")
+
+def _render_type(schema: Dict[str, Any]) -> str:
+    if not isinstance(schema, dict):
+        return "any"
+    if "enum" in schema:
+        return "|".join(json.dumps(v) for v in schema["enum"][:8]) + ("|..." if len(schema["enum"]) > 8 else "")
+    for combo in ("anyOf", "oneOf"):
+        if combo in schema:
+            return "|".join(dict.fromkeys(_render_type(s) for s in schema[combo] if not (isinstance(s, dict) and s.get("type") == "null"))) or "any"
+    kind = schema.get("type", "any")
+    if isinstance(kind, list):
+        return "|".join(_render_type({**schema, "type": k}) for k in kind if k != "null")
+    if kind == "array":
+        return f"list[{_render_type(schema.get('items', {}))}]"
+    return {"string": "str", "integer": "int", "number": "float", "boolean": "bool", "object": "dict"}.get(kind, str(kind))
+
+def _render_tool(scoped_name: str, tool: Dict[str, Any], with_description: bool = True) -> str:
+    """`- server_tool(path: str, mode?: "r"|"w") — First sentence of the description.`"""
+    schema = tool.get("inputSchema") or {}
+    required = set(schema.get("required", []))
+    args = [
+        f"{arg}{'' if arg in required else '?'}: {_render_type(spec)}"
+        for arg, spec in (schema.get("properties") or {}).items()
+    ]
+    line = f"- {scoped_name}({', '.join(args)})"
+    description = (tool.get("description") or "").strip().split("\n")[0]
+    if with_description and description:
+        description = description.split(". ")[0].rstrip(".")
+        line += f" — {description[:120]}"
+    return line
+
+def _render_server(server: str, tools: List[Dict[str, Any]], budget_tokens: int) -> str:
+    """Renders a server's tools within ~budget_tokens (4 chars/token): full, then without descriptions, then truncated."""
+    budget = budget_tokens * 4
+    full = [_render_tool(f"{server}_{t['name']}", t) for t in tools]
+    if sum(len(l) + 1 for l in full) <= budget:
+        return "\n".join(full)
+    short = [_render_tool(f"{server}_{t['name']}", t, with_description=False) for t in tools]
+    lines, used = [], 0
+    for line in short:
+        if used + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    if len(lines) < len(short):
+        rest = [f"{server}_{t['name']}" for t in tools[len(lines):]]
+        lines.append(f"- ... {len(rest)} more: {', '.join(rest)[:max(budget - used, 80)]}")
+    return "\n".join(lines)
+
+def _load_tools_cache() -> Dict[str, Any]:
+    try:
+        with open(TOOLS_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_tools_cache(cache: Dict[str, Any]):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = TOOLS_CACHE_FILE.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, TOOLS_CACHE_FILE)
+    except Exception:
+        pass
+
 class MCPManager:
     def __init__(self, settings: GlobalSettings):
         self.settings = settings
-        self.sessions: Dict[str, ClientSession] = {}
-        self.tools_map: Dict[str, Any] = {} 
-        self.exit_stack = None
+        self.sessions: Dict[str, Any] = {}
+        self.tools_map: Dict[str, Any] = {}
         self.failed_servers: Dict[str, str] = {}
         self.enabled = settings.mcp_enabled
+        self.is_connected = False
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stops: Dict[str, asyncio.Event] = {}
+        self._call_limits: Dict[str, asyncio.Semaphore] = {}
+        self._tools_cache = None
+        self._schema = None
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _params(self, cfg: MCPServerConfig):
+        from mcp import StdioServerParameters
+        cmd = cfg.command
+        if cmd == "npx" and os.name == "nt":
+            cmd = "npx.cmd"
+        if not shutil.which(cmd):
+            raise FileNotFoundError(f"'{cmd}' not found.")
+        env = os.environ.copy()
+        env.update(cfg.env)
+        return StdioServerParameters(command=cmd, args=cfg.args, env=env)
+
+    async def _serve(self, name: str, params, ready: asyncio.Future, stop: asyncio.Event):
+        """
+        Owns one server for its whole lifetime. The stdio/session contexts must be
+        entered and exited in the same task, so each server lives in its own task
+        until its stop event is set.
+        """
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+        try:
+            async with stdio_client(params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    init = await session.initialize()
+                    tools = await session.list_tools()
+                    ready.set_result((session, [_tool_def(t) for t in tools.tools], _server_version(init)))
+                    await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        except BaseException:
+            ready.cancel()
+            raise
+        finally:
+            if self._tasks.get(name) is asyncio.current_task():
+                self.sessions.pop(name, None)
+                self._tasks.pop(name, None)
+
+    def _register_tools(self, name: str, tools: List[Dict[str, Any]]):
+        self._drop_tools(name)
+        for tool in tools:
+            self.tools_map[f"{name}_{tool['name']}"] = {"server": name, "def": tool}
+        self._schema = None
+
+    def _drop_tools(self, name: str):
+        for scoped in [k for k, m in self.tools_map.items() if m["server"] == name]:
+            del self.tools_map[scoped]
+        self._schema = None
+
+    async def _connect(self, name: str, cfg: MCPServerConfig):
+        if self._tools_cache is None:
+            self._tools_cache = _load_tools_cache()
+        ready = asyncio.get_running_loop().create_future()
+        stop = self._stops[name] = asyncio.Event()
+        task = asyncio.create_task(self._serve(name, self._params(cfg), ready, stop))
+        self._tasks[name] = task
+        try:
+            session, tools, version = await asyncio.wait_for(asyncio.shield(ready), self.settings.mcp_connect_timeout)
+        except BaseException:
+            task.cancel()
+            raise
+
+        self.sessions[name] = session
+        cached = self._tools_cache.get(name) or {}
+        if (cached.get("key"), cached.get("version"), cached.get("tools")) != (_cache_key(cfg), version, tools):
+            self._register_tools(name, tools)
+            self._tools_cache[name] = {"key": _cache_key(cfg), "version": version, "tools": tools}
+        elif not any(m["server"] == name for m in self.tools_map.values()):
+            self._register_tools(name, tools)
+        self.failed_servers.pop(name, None)
+        self._stat(name, "starts")
+        memory_core.log_event("system", {"server": name, "tools": len(tools)}, "mcp_connected")
+        return session
+
+    async def _connect_logged(self, name: str, cfg: MCPServerConfig) -> bool:
+        try:
+            await self._connect(name, cfg)
+            print(f"[MCP] Connected: {name}")
+            return True
+        except asyncio.TimeoutError:
+            self.failed_servers[name] = f"Timed out after {self.settings.mcp_connect_timeout:g}s"
+        except Exception as e:
+            self.failed_servers[name] = str(e)
+        self._drop_tools(name)
+        print(f"[MCP] Failed to connect to '{name}': {self.failed_servers[name]}")
+        return False
 
     async def connect_all(self):
+        """
+        Registers cached tool lists immediately, then starts all eager servers concurrently.
+        Lazy servers with a cached tool list are deferred to their first call.
+        """
         if not self.enabled:
             return
-            
-        from contextlib import AsyncExitStack
-        self.exit_stack = AsyncExitStack()
 
+        self._tools_cache = _load_tools_cache()
+        pending = []
         for name, cfg in self.settings.mcp_servers.items():
-            if not cfg.enabled: continue 
-
-            cmd = cfg.command
-            if cmd == "npx" and os.name == "nt":
-                cmd = "npx.cmd"
-
-            if not shutil.which(cmd):
-                print(f"[MCP] Error: '{cmd}' not found.")
+            if not cfg.enabled or name in self.sessions:
                 continue
+            cached = self._tools_cache.get(name)
+            if cached and cached.get("key") == _cache_key(cfg):
+                self._register_tools(name, cached["tools"])
+                if cfg.lazy:
+                    continue
+            pending.append(self._connect_logged(name, cfg))
 
-            try:
-                env = os.environ.copy()
-                env.update(cfg.env)
-
-                params = StdioServerParameters(
-                    command=cmd, 
-                    args=cfg.args, 
-                    env=env
-                )
-
-                read, write = await self.exit_stack.enter_async_context(stdio_client(params))
-                session = await self.exit_stack.enter_async_context(ClientSession(read, write))
-                await session.initialize()
-                
-                self.sessions[name] = session
-                
-                tools = await session.list_tools()
-                for tool in tools.tools:
-                    scoped_name = f"{name}_{tool.name}" 
-                    self.tools_map[scoped_name] = {"session": session, "def": tool}
-                
-                memory_core.log_event("system", {"server": name, "tools": len(tools.tools)}, "mcp_connected")
-                print(f"[MCP] Connected: {name}")
-                    
-            except Exception as e:
-                error_msg = str(e)
-                self.failed_servers[name] = error_msg
-                print(f"[MCP] Failed to connect to '{name}': {error_msg}")
-        
+        if pending:
+            await asyncio.gather(*pending)
+            _save_tools_cache(self._tools_cache)
         self.is_connected = True
 
+    def _stat(self, name: str, key: str):
+        counters = self.stats.setdefault(name, {"starts": 0, "calls": 0, "errors": 0, "restarts": 0})
+        counters[key] += 1
+
+    async def _ensure_session(self, name: str):
+        session = self.sessions.get(name)
+        if session is not None:
+            return session
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if name not in self.sessions:
+                print(f"[MCP] Starting server: {name}")
+                await self._connect(name, self.settings.mcp_servers[name])
+                _save_tools_cache(self._tools_cache)
+            return self.sessions[name]
+
+    async def _stop_server(self, name: str):
+        task = self._tasks.pop(name, None)
+        self.sessions.pop(name, None)
+        stop = self._stops.pop(name, None)
+        if stop:
+            stop.set()
+        if task:
+            _, still_running = await asyncio.wait([task], timeout=5)
+            for t in still_running:
+                t.cancel()
+
+    def _server_died(self, name: str, session) -> bool:
+        task = self._tasks.get(name)
+        return self.sessions.get(name) is not session or task is None or task.done()
+
+    async def _restart(self, name: str, dead_session):
+        """Replaces a server whose session failed; concurrent callers share one restart."""
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if self.sessions.get(name) is dead_session:
+                print(f"[MCP] Restarting server: {name}")
+                self._stat(name, "restarts")
+                await self._stop_server(name)
+        return await self._ensure_session(name)
+
+    async def _call(self, session, tool_name: str, arguments: dict):
+        result = await session.call_tool(tool_name, arguments=arguments)
+        output = []
+        for content in result.content:
+            if content.type == "text":
+                output.append(content.text)
+            elif content.type == "image":
+                output.append("[Image Data]")
+        return "\n".join(output)
 
     async def execute_tool(self, tool_name: str, arguments: dict) -> str:
         if not self.enabled:
             return "MCP Error: MCP is globally disabled."
         if tool_name not in self.tools_map:
             return f"MCP Error: Tool '{tool_name}' not found."
-        
+
         mapping = self.tools_map[tool_name]
-        session = mapping["session"]
-        original_name = mapping["def"].name
-        
+        server = mapping["server"]
+        original_name = mapping["def"]["name"]
+        # Requests are multiplexed over the server's single session, bounded per server.
+        limit = self._call_limits.setdefault(server, asyncio.Semaphore(self.settings.mcp_max_concurrent_calls))
+        self._stat(server, "calls")
+
+        session = None
         try:
-            result = await session.call_tool(original_name, arguments=arguments)
-            output = []
-            for content in result.content:
-                if content.type == "text":
-                    output.append(content.text)
-                elif content.type == "image":
-                    output.append("[Image Data]")
-            return "\n".join(output)
+            async with limit:
+                session = await self._ensure_session(server)
+                try:
+                    return await self._call(session, original_name, arguments)
+                except Exception as e:
+                    # Only a broken transport or a dead server is restarted and retried. Errors the
+                    # server returned (McpError, invalid params, ...) propagate, so a healthy server
+                    # is not restarted and a non-idempotent tool does not run twice.
+                    if not (_is_transport_error(e) or self._server_died(server, session)):
+                        raise
+                    memory_core.log_event("system", {"tool": tool_name, "error": str(e)}, "mcp_exec_fail")
+                    session = await self._restart(server, session)
+                    return await self._call(session, original_name, arguments)
         except Exception as e:
+            self._stat(server, "errors")
             memory_core.log_event("system", {"tool": tool_name, "error": str(e)}, "mcp_exec_fail")
             return f"MCP Execution Error: {e}"
 
     def get_tools_schema(self) -> str:
+        """Typed, budgeted toolkit text; re-rendered only when a server's tool list changes."""
         if not self.enabled:
             return "MCP disabled"
-        schemas = []
-        for name, mapping in self.tools_map.items():
-            tool_def = mapping["def"]
-            props = list(tool_def.inputSchema.get('properties', {}).keys())
-            schemas.append(f"- {name}({', '.join(props)})")
-        return "\n".join(schemas)
+        if self._schema is None:
+            by_server: Dict[str, List[Dict[str, Any]]] = {}
+            for mapping in self.tools_map.values():
+                by_server.setdefault(mapping["server"], []).append(mapping["def"])
+            self._schema = "\n".join(
+                _render_server(server, tools, self.settings.mcp_schema_token_budget)
+                for server, tools in by_server.items()
+            )
+        return self._schema
 
-    async def cleanup(self):
-        if self.exit_stack:
+    def _server_processes(self) -> Dict[str, List[Any]]:
+        """Descendant processes of this interpreter, attributed to servers by their command line."""
+        if not PSUTIL_AVAILABLE:
+            return {}
+        owned: Dict[str, List[Any]] = {}
+        try:
+            children = psutil.Process().children(recursive=True)
+        except Exception:
+            return {}
+        markers = {
+            name: [a for a in cfg.args if a not in ("-y", "--yes") and not a.startswith("-")] or [cfg.command]
+            for name, cfg in self.settings.mcp_servers.items()
+        }
+        for proc in children:
             try:
-                await self.exit_stack.aclose()
+                cmdline = " ".join(proc.cmdline())
             except Exception:
-                pass
\ No newline at end of file
+                continue
+            for name, needles in markers.items():
+                if name in self.sessions and any(n in cmdline for n in needles):
+                    owned.setdefault(name, []).append(proc)
+                    break
+        return owned
+
+    def report(self) -> str:
+        if not self.enabled:
+            return "MCP disabled."
+        processes = self._server_processes()
+        lines = []
+        total_rss = 0
+        for name, cfg in self.settings.mcp_servers.items():
+            if not cfg.enabled:
+                continue
+            if name in self.sessions:
+                status = "connected"
+            elif name in self.failed_servers:
+                status = f"failed: {self.failed_servers[name]}"
+            else:
+                status = "lazy (not started)" if cfg.lazy else "not started"
+            tools = sum(1 for m in self.tools_map.values() if m["server"] == name)
+            counters = self.stats.get(name, {})
+            line = (f"{name}: {status} | tools {tools} | calls {counters.get('calls', 0)}"
+                    f" | errors {counters.get('errors', 0)} | restarts {counters.get('restarts', 0)}")
+            procs = processes.get(name, [])
+            if procs:
+                rss = 0
+                for proc in procs:
+                    try:
+                        rss += proc.memory_info().rss
+                    except Exception:
+                        pass
+                total_rss += rss
+                line += f" | {len(procs)} proc, {rss / 1048576:.0f} MB RSS"
+            lines.append(line)
+        if PSUTIL_AVAILABLE:
+            lines.append(f"Total server RSS: {total_rss / 1048576:.0f} MB")
+        else:
+            lines.append("Install 'psutil' to see server processes and RSS.")
+        return "\n".join(lines)
+
+    async def cleanup(self):
+        for name in list(self._tasks):
+            await self._stop_server(name)
+
+class MCPRegistry:
+    """
+    One MCPManager per process, shared by the orchestrator and every agent.
+    Owners acquire()/release() it; servers shut down when the last owner releases.
+    """
+    def __init__(self):
+        self.manager: Optional[MCPManager] = None
+        self.refs = 0
+
+    def acquire(self, settings: GlobalSettings) -> MCPManager:
+        if self.manager is None:
+            self.manager = MCPManager(settings)
+        self.refs += 1
+        return self.manager
+
+    async def release(self):
+        self.refs = max(0, self.refs - 1)
+        if self.refs == 0 and self.manager:
+            manager, self.manager = self.manager, None
+            await manager.cleanup()
+
+    @asynccontextmanager
+    async def lease(self, settings: GlobalSettings):
+        """Holds a reference to the shared manager for the length of one agent run."""
+        manager = self.acquire(settings)
+        try:
+            yield manager
+        finally:
+            await self.release()
+
+    def report(self) -> str:
+        if self.manager is None:
+            return "MCP not initialized."
+        return f"Owners: {self.refs}\n{self.manager.report()}"
+
+mcp_registry = MCPRegistry()
@@ -1,66 +1,173 @@
+import atexit
 import json
+import shutil
+import threading
 import time
 import uuid
 import os
 from datetime import datetime
+from functools import wraps
 from pathlib import Path
 from typing import List, Dict, Any
+from src.core.session_log import SessionLogWriter
+from src.core.kg_store import open_kg_store
+from src.core.search_index import BM25Index
 
-try:
-    import chromadb
-    CHROMA_AVAILABLE = True
-except ImportError:
-    CHROMA_AVAILABLE = False
+from importlib.util import find_spec
+
+# chromadb is heavy to import; only check that it is installed here and load it on first vector use.
+CHROMA_AVAILABLE = find_spec("chromadb") is not None
+if not CHROMA_AVAILABLE:
     print("[Memory] Warning: 'chromadb' not found. Semantic search disabled.")
 
 MEMORY_DIR = Path("tmp") / "memory"
 SESSIONS_DIR = MEMORY_DIR / "sessions"
 KG_FILE = MEMORY_DIR / "knowledge_graph.json"
 VECTOR_DIR = MEMORY_DIR / "vector_store"
+INDEX_FILE = MEMORY_DIR / "keyword_index.json"
 
 MEMORY_DIR.mkdir(parents=True, exist_ok=True)
 SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
 
+FACTS_COLLECTION = "zervgen_facts"
+
+def _locked(method):
+    # Memory tools run on the dispatcher's thread pool, so fact/index/vector access is serialized.
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class MemoryManager:
     def __init__(self):
-        self.kg_data = self._load_kg()
+        self._lock = threading.RLock()
+        self._kg_store = None
+        self._kg_data = None
         self.current_session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         self.session_file = SESSIONS_DIR / f"{self.current_session_id}.jsonl"
         self.history_buffer = [] 
+        self.log_writer = SessionLogWriter()
+        atexit.register(self.close)
+        self.kg_version = 0
+        self._keyword_index = None
+        self._facts_by_id: Dict[str, Dict[str, Any]] = {}
         self.chroma_client = None
-        self.collection = None
-        if CHROMA_AVAILABLE:
-            try:
-                self.chroma_client = chromadb.PersistentClient(path=str(VECTOR_DIR))
-                self.collection = self.chroma_client.get_or_create_collection(name="zervgen_facts")
-            except Exception as e:
-                print(f"[Memory] Vector DB Init Error: {e}")
+        self._collection = None
+        self._vector_init = False
 
-        self.stats = {
-            "total_memories": len(self.kg_data.get("facts", [])),
+        self._stats = {
+            "total_memories": 0,
             "successful_queries": 0,
-            "vector_enabled": self.collection is not None
+            "vector_enabled": CHROMA_AVAILABLE
         }
+
+    @_locked
+    def _open_kg(self):
+        # The backend comes from config.json, so it is resolved here rather than at import time.
+        if self._kg_store is None:
+            self._kg_store, facts = open_kg_store(self._kg_backend(), MEMORY_DIR)
+            self._kg_data = {"facts": facts}
+            self._stats["total_memories"] = len(self._kg_data["facts"])
+
+    @property
+    def kg_store(self):
+        """Knowledge-graph store, opened on first access."""
+        self._open_kg()
+        return self._kg_store
+
+    @property
+    def kg_data(self) -> Dict[str, Any]:
+        self._open_kg()
+        return self._kg_data
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        self._open_kg()
+        return self._stats
+
+    @property
+    def collection(self):
+        """Chroma collection, opened on first access."""
+        if not self._vector_init:
+            self._vector_init = True
+            if CHROMA_AVAILABLE:
+                try:
+                    import chromadb
+                    self.chroma_client = chromadb.PersistentClient(path=str(VECTOR_DIR))
+                    self._collection = self.chroma_client.get_or_create_collection(name=FACTS_COLLECTION)
+                except Exception as e:
+                    print(f"[Memory] Vector DB Init Error: {e}")
+            self._stats["vector_enabled"] = self._collection is not None
+        return self._collection
         
-    def _load_kg(self) -> Dict[str, Any]:
-        if KG_FILE.exists():
+    def vector_collection(self, name: str):
+        """Another named collection in the same Chroma store, or None when vectors are unavailable."""
+        if self.collection is None:
+            return None
+        try:
+            return self.chroma_client.get_or_create_collection(name=name)
+        except Exception as e:
+            print(f"[Memory] Vector DB Init Error: {e}")
+            return None
+
+    @staticmethod
+    def _kg_backend() -> str:
+        try:
+            from src.config import get_settings
+            return get_settings().memory_backend
+        except:
+            return "sqlite"
+
+    def _kg_changed(self):
+        self.stats["total_memories"] = len(self.kg_data["facts"])
+        self.kg_version += 1
+
+    def _index(self) -> BM25Index:
+        """Keyword index over facts, loaded from disk and reconciled on first use."""
+        if self._keyword_index is None:
+            facts = self.kg_data.get("facts", [])
+            index = BM25Index.load(INDEX_FILE)
+            index.sync((f.get("id"), f.get("content", "")) for f in facts)
+            self._facts_by_id = {f.get("id"): f for f in facts}
+            self._keyword_index = index
+            if index.dirty:
+                self._save_index()
+        return self._keyword_index
+
+    def _save_index(self):
+        if self._keyword_index is not None and self._keyword_index.dirty:
             try:
-                with open(KG_FILE, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except:
-                return {"facts": []}
-        return {"facts": []}
+                self._keyword_index.save(INDEX_FILE)
+            except Exception as e:
+                print(f"[Memory] Keyword index save failed: {e}")
+
+    def _index_facts(self, facts: List[Dict[str, Any]]):
+        if self._keyword_index is None:
+            return
+        for fact in facts:
+            self._keyword_index.add(fact["id"], fact["content"])
+            self._facts_by_id[fact["id"]] = fact
 
     def _save_kg(self):
-        with open(KG_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.kg_data, f, indent=2, ensure_ascii=False)
-        self.stats["total_memories"] = len(self.kg_data["facts"])
+        """Persists a rewritten fact list (evolve); plain inserts go through kg_store.add."""
+        self.kg_store.replace_all(self.kg_data["facts"])
+        self._kg_changed()
+
+    def _new_fact(self, content: str, category: str) -> Dict[str, Any]:
+        return {
+            "id": str(uuid.uuid4())[:8],
+            "timestamp": time.time(),
+            "content": str(content),
+            "category": str(category)
+        }
 
     def log_event(self, role: str, content: Any = "", event_type: str = "message"):
         try:
-            from src.config import load_config
-            cfg = load_config()
+            from src.config import get_settings
+            cfg = get_settings()
             truncate = cfg.log_truncation
+            self.log_writer.fsync = cfg.log_fsync
         except:
             truncate = True
 
@@ -86,8 +193,7 @@ class MemoryManager:
         }
         
         try:
-            with open(self.session_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.log_writer.write(self.session_file, json.dumps(entry, ensure_ascii=False, default=str) + "\n")
         except: pass
 
         if event_type in ["message", "tool_result", "thought", "final_answer"]:
@@ -100,6 +206,7 @@ class MemoryManager:
     def load_session_from_file(self, filename: str) -> List[Dict]:
         path = SESSIONS_DIR / filename
         if not path.exists(): return []
+        self.log_writer.flush()
         reconstructed_history = []
         valid_lines = 0
         errors = 0
@@ -149,15 +256,13 @@ class MemoryManager:
         recents = facts[-limit:]
         return "RECENT MEMORIES:\n" + "\n".join([f"- {r.get('content')}" for r in recents])
 
+    @_locked
     def add_memory(self, content: str, category: str = "general", *args, **kwargs):
-        fact = {
-            "id": str(uuid.uuid4())[:8],
-            "timestamp": time.time(),
-            "content": str(content),
-            "category": str(category)
-        }
+        fact = self._new_fact(content, category)
+        self.kg_store.add(fact)
         self.kg_data.setdefault("facts", []).append(fact)
-        self._save_kg()
+        self._index_facts([fact])
+        self._kg_changed()
 
         # Vector DB
         if self.collection:
@@ -173,8 +278,31 @@ class MemoryManager:
         
         return f"Memory stored (JSON only): [{category}] {content}"
 
-    def search_memory(self, query: str, mode: str = "semantic", *args, **kwargs) -> str:
+    @_locked
+    def add_memories(self, items: List[Dict[str, str]]) -> str:
+        """Stores [{"content": ..., "category": ...}, ...] in one transaction."""
+        facts = [self._new_fact(item.get("content", ""), item.get("category", "general")) for item in items if item.get("content")]
+        if not facts:
+            return "No memories to store."
+        self.kg_store.add_many(facts)
+        self.kg_data.setdefault("facts", []).extend(facts)
+        self._index_facts(facts)
+        self._kg_changed()
+
         if self.collection:
+            try:
+                self.collection.add(
+                    documents=[f["content"] for f in facts],
+                    metadatas=[{"category": f["category"], "timestamp": f["timestamp"]} for f in facts],
+                    ids=[f["id"] for f in facts]
+                )
+            except Exception as e:
+                return f"Stored {len(facts)} memories (JSON only, Vector failed): {e}"
+        return f"Stored {len(facts)} memories."
+
+    @_locked
+    def search_memory(self, query: str, mode: str = "semantic", *args, **kwargs) -> str:
+        if self.collection and mode != "keyword":
             try:
                 results = self.collection.query(
                     query_texts=[query],
@@ -187,15 +315,25 @@ class MemoryManager:
             except Exception as e:
                 print(f"Vector search failed: {e}")
 
-        # Old way
+        ranked = self._index().search(query, limit=10)
+        if ranked:
+            self.stats["successful_queries"] += 1
+            lines = []
+            for doc_id, score in ranked:
+                fact = self._facts_by_id.get(doc_id, {})
+                lines.append(f"- [{fact.get('category', 'general')}] {fact.get('content')} (score {score:.2f})")
+            return "FOUND MEMORIES (Keyword/BM25):\n" + "\n".join(lines)
+
+        # Substring match for partial words the tokenizer cannot see
         results = []
         for fact in self.kg_data.get("facts", []):
             if query.lower() in fact.get("content", "").lower():
                 results.append(f"- [{fact.get('category', 'general')}] {fact.get('content')}")
         return "FOUND MEMORIES (Text Match):\n" + "\n".join(results[-10:]) if results else "No relevant memories found."
 
+    @_locked
     def evolve(self) -> str:
-        self.stats["evolution_events"] += 1
+        self.stats["evolution_events"] = self.stats.get("evolution_events", 0) + 1
         facts = self.kg_data.get("facts", [])
         if len(facts) < 5: return "Not enough data."
         unique = {f["content"]: f for f in facts}.values()
@@ -203,10 +341,63 @@ class MemoryManager:
         if removed > 0:
             self.kg_data["facts"] = list(unique)
             self._save_kg()
+            if self._keyword_index is not None:
+                kept = {f.get("id") for f in self.kg_data["facts"]}
+                for fact in facts:
+                    if fact.get("id") not in kept:
+                        self._keyword_index.remove(fact.get("id"))
+                        self._facts_by_id.pop(fact.get("id"), None)
+                self._save_index()
             return f"Cleaned {removed} duplicates."
         return "Memory optimal."
 
     def get_stats(self) -> str:
         return str(self.stats)
 
+    def flush(self):
+        self.log_writer.flush()
+
+    @_locked
+    def reset(self):
+        """
+        Wipes all stored memory and reopens the stores in place. The instance itself
+        stays live, since the orchestrator, agents and tools all hold memory_core.
+        """
+        self.log_writer.close()
+        if self._kg_store is not None:
+            self._kg_store.close()
+        self._kg_store = None
+        self._kg_data = None
+        self._keyword_index = None
+        self._facts_by_id = {}
+
+        # The Chroma client keeps its files open, so facts are dropped through it and the
+        # other collections in the store (e.g. the response cache) are left alone.
+        if self.collection is not None:
+            try:
+                self.chroma_client.delete_collection(FACTS_COLLECTION)
+            except Exception as e:
+                print(f"[Memory] Vector DB Reset Error: {e}")
+            self._collection = None
+            self._vector_init = False
+        for entry in MEMORY_DIR.iterdir():
+            if entry == VECTOR_DIR and self.chroma_client is not None:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+        SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+
+        self.log_writer = SessionLogWriter()
+        self.history_buffer = []
+        self._stats.update({"total_memories": 0, "successful_queries": 0})
+        self.kg_version += 1
+
+    def close(self):
+        self.log_writer.close()
+        self._save_index()
+        if self._kg_store is not None:
+            self._kg_store.close()
+
 memory_core = MemoryManager()
\ No newline at end of file
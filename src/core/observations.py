@@ -0,0 +1,128 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+from src.core.tool_batch import WRITE_TOOLS
+
+# Tools whose output is "### <path>\n<content>" sections, tracked per file.
+FILE_READ_TOOLS = frozenset({"read_files"})
+# Shorter results are cheaper to repeat than to reference.
+MIN_DEDUP_CHARS = 200
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
+
+def _path_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+def _read_paths(args: dict) -> List[str]:
+    paths = args.get("paths", args.get("path", ""))
+    if isinstance(paths, list):
+        return [str(p).strip() for p in paths]
+    return [p.strip() for p in str(paths).split(",") if p.strip()]
+
+def _split_sections(text: str, paths: List[str]) -> Optional[List[Tuple[str, str]]]:
+    """Splits read_files output into (path, section) pairs, or None if it does not match the paths."""
+    sections, pos = [], 0
+    starts = []
+    for path in paths:
+        start = text.find(f"### {path}\n", pos)
+        if start < 0:
+            return None
+        starts.append((path, start))
+        pos = start + 1
+    for i, (path, start) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else len(text)
+        sections.append((path, text[start:end].rstrip("\n")))
+    return sections
+
+class ObservationStore:
+    """
+    Content-addressed record of the tool results placed in history. Each result is tagged
+    "[#n]"; a result identical to one still present verbatim in history becomes a short
+    reference to it, a file re-read with unchanged content is referenced the same way, and
+    an earlier read of a file that was re-read with new content or written is elided in place.
+    """
+    def __init__(self):
+        self.seq = 0
+        # result hash -> (observation id, text as placed in history)
+        self._by_hash: Dict[str, Tuple[int, str]] = {}
+        # path key -> (observation id, section text as placed in history)
+        self._reads: Dict[str, Tuple[int, str]] = {}
+        self.stats = {"observations": 0, "repeats": 0, "elided": 0, "saved_chars": 0}
+
+    @staticmethod
+    def _live(history: List[Dict], obs_id: int, text: str) -> bool:
+        """True if `text` of observation #obs_id is still in history verbatim (not evicted, compacted or elided)."""
+        tag = f"[#{obs_id}]"
+        return any(tag in content and text in content for content in (str(m.get("content", "")) for m in history))
+
+    def _elide(self, history: List[Dict], key: str, note: str):
+        previous = self._reads.pop(key, None)
+        if not previous:
+            return
+        obs_id, section = previous
+        header = section.split("\n", 1)[0]
+        tag = f"[#{obs_id}]"
+        for i in range(len(history) - 1, -1, -1):
+            content = str(history[i].get("content", ""))
+            if tag in content and section in content:
+                history[i] = {**history[i], "content": content.replace(section, f"{header}\n[{note}]", 1)}
+                self.stats["elided"] += 1
+                self.stats["saved_chars"] += len(section) - len(header) - len(note) - 3
+                return
+
+    def record(self, history: List[Dict], tool_name: str, args: dict, result, max_chars: int) -> str:
+        """
+        Registers one tool result and returns the text to put in history for it, prefixed
+        with its "[#n]" tag and truncated to `max_chars`. Earlier history messages may be
+        rewritten in place to elide outdated file contents.
+        """
+        self.seq += 1
+        obs_id = self.seq
+        self.stats["observations"] += 1
+        args = args if isinstance(args, dict) else {}
+        text = str(result)
+
+        if tool_name in WRITE_TOOLS and isinstance(args.get("path"), str):
+            self._elide(history, _path_key(args["path"]), f"outdated: changed by {tool_name} in #{obs_id}")
+
+        if tool_name in FILE_READ_TOOLS:
+            sections = _split_sections(text, _read_paths(args))
+            if sections:
+                parts, placed = [], []
+                for path, section in sections:
+                    key = _path_key(path)
+                    earlier = self._reads.get(key)
+                    if earlier and earlier[1] == section and self._live(history, *earlier):
+                        parts.append(f"### {path}\n[unchanged since observation #{earlier[0]}]")
+                        self.stats["saved_chars"] += len(section)
+                        continue
+                    if earlier:
+                        self._elide(history, key, f"outdated: superseded by #{obs_id}")
+                    parts.append(section)
+                    placed.append((key, section))
+                text = "\n\n".join(parts)
+                if len(text) > max_chars:
+                    text = text[:max_chars] + "... [TRUNCATED]"
+                for key, section in placed:
+                    # Only sections that survived truncation can be elided or referenced later.
+                    if section in text:
+                        self._reads[key] = (obs_id, section)
+                return f"[#{obs_id}] {text}"
+
+        full_hash = _digest(text)
+        previous = self._by_hash.get(full_hash)
+        if len(text) >= MIN_DEDUP_CHARS and previous and self._live(history, *previous):
+            self.stats["repeats"] += 1
+            self.stats["saved_chars"] += len(text)
+            return f"[#{obs_id}] same as observation #{previous[0]} (identical output)"
+
+        if len(text) > max_chars:
+            text = text[:max_chars] + "... [TRUNCATED]"
+        self._by_hash[full_hash] = (obs_id, text)
+        return f"[#{obs_id}] {text}"
+
+    def reset(self):
+        self.seq = 0
+        self._by_hash.clear()
+        self._reads.clear()
@@ -1,16 +1,21 @@
+import asyncio
 import json
+from contextlib import aclosing
 from pathlib import Path
 from rich.prompt import Confirm
 from rich.console import Console
 from rich.panel import Panel
-from src.core.provider import AIProvider
+from src.core.provider import AIProvider, SystemPrompt
 from src.config import GlobalSettings
-from src.providers.pollinations import PollinationsProvider
-from src.tools import TOOL_REGISTRY, get_tools_schema, download_and_open_image, extract_json_from_text
-from src.utils import get_system_context
-from src.core.mcp_manager import MCPManager
+from src.tools import TOOL_REGISTRY, READ_ONLY_TOOLS, get_tools_schema, download_and_open_image, extract_json_from_text
+from src.utils import get_system_context, StreamingJSONParser
+from src.core.mcp_manager import mcp_registry
 from src.core.memory import memory_core
-from src.skills_loader import load_role, get_all_roles, get_roles_overview
+from src.core.dispatcher import tool_dispatcher
+from src.core.tool_batch import parse_calls, run_calls, format_observations
+from src.core.history import HistoryManager, active_model
+from src.providers.cached import request_mode
+from src.skills_loader import load_role, get_all_roles, get_roles_overview, skill_registry
 from src.core.base_agent import BaseAgent
 
 console = Console()
@@ -20,11 +25,16 @@ class Orchestrator:
         self.brain = provider
         self.settings = settings
         self.history = []
+        self.history_manager = HistoryManager(settings)
         self.max_steps = self.settings.max_steps
-        self.mcp = MCPManager(self.settings)
+        self.mcp = mcp_registry.acquire(self.settings)
         self.mcp_initialized = False
         self.current_role = "system"
         self.current_mode = settings.mode
+        self.on_stream = None
+        self._static_prompt = (None, "")
+        self._memory_block = (None, "")
+        self.prompt_stats = {"static_builds": 0, "static_hits": 0, "memory_builds": 0}
 
     async def _ensure_mcp(self):
         if not self.mcp_initialized and self.settings.mcp_enabled:
@@ -47,27 +57,108 @@ class Orchestrator:
             return True
         return False
 
-    def _build_system_prompt(self, role_cfg) -> str:
+    def _build_system_prompt(self) -> SystemPrompt:
+        """
+        Reuses the static prefix until role, mode or the skill registry change, and the
+        memory block until the knowledge graph changes. Only the context line is
+        rebuilt every step.
+        """
         from src.config import MODES
-        context = get_system_context()
-        roles_info = get_roles_overview()
-        memories = memory_core.get_recent_memories(limit=5)
-        mode_def = MODES.get(self.current_mode, MODES["BUILD"])
-        
-        return (
-            f"{role_cfg.prompt}\n\n"
-            f"=== OP STATE ===\n"
-            f"ROLE: {self.current_role}\n"
-            f"BEHAVIOR: {mode_def['prompt']}\n\n"
-            f"--- CONTEXT ---\n{context}\n"
-            f"--- MEMORY ---\n{memories}\n"
-            f"--- ROLES ---\n{roles_info}"
+        static_key = (self.current_role, self.current_mode, skill_registry.current_version())
+        if self._static_prompt[0] != static_key:
+            role_cfg = load_role(self.current_role) or load_role("system")
+            roles_info = get_roles_overview()
+            mode_def = MODES.get(self.current_mode, MODES["BUILD"])
+            static = (
+                f"{role_cfg.prompt}\n\n"
+                f"=== OP STATE ===\n"
+                f"ROLE: {self.current_role}\n"
+                f"BEHAVIOR: {mode_def['prompt']}\n\n"
+                f"--- ROLES ---\n{roles_info}\n\n"
+                f"=== CURRENT FOCUS: {mode_def['prompt']} ==="
+            )
+            self._static_prompt = (static_key, static)
+            self.prompt_stats["static_builds"] += 1
+        else:
+            self.prompt_stats["static_hits"] += 1
+
+        if self._memory_block[0] != memory_core.kg_version:
+            self._memory_block = (memory_core.kg_version, memory_core.get_recent_memories(limit=5))
+            self.prompt_stats["memory_builds"] += 1
+
+        if self.settings.debug_mode:
+            console.print(f"[dim]♻ Prompt cache: {self.prompt_stats}[/dim]")
+
+        dynamic = (
+            f"--- CONTEXT ---\n{get_system_context()}\n"
+            f"--- MEMORY ---\n{self._memory_block[1]}"
         )
+        return SystemPrompt(self._static_prompt[1], dynamic)
         
+    def _reply_preview(self, text: str, parser: StreamingJSONParser):
+        stripped = text.lstrip()
+        if stripped and not stripped.startswith(("{", "`")):
+            # Prose ahead of the action JSON: show the prose only, as the final display does.
+            # Braces the parser already dropped as non-action (code in prose) stay visible.
+            cuts = [i for i in (parser.start, text.find("```json")) if i >= 0]
+            return text[:min(cuts)].rstrip() if cuts else text
+        if parser.get("tool") != "response":
+            return None
+        return parser.partial("args", "text")
+
+    def _emit_stream(self, text):
+        if self.on_stream:
+            self.on_stream(text)
+
+    async def _stream_response(self, full_prompt: str, status):
+        response_text = ""
+        parser = StreamingJSONParser()
+        early = None
+        streaming_reply = False
+        try:
+            async with aclosing(self.brain.stream_text(self.history, full_prompt)) as stream:
+                async for delta in stream:
+                    response_text += delta
+                    parser.feed(delta)
+
+                    tool_name = parser.get("tool")
+                    args = parser.get("args")
+                    if early is None and tool_name in READ_ONLY_TOOLS and isinstance(args, dict):
+                        early = {"tool": tool_name, "args": args, "task": asyncio.create_task(self._execute_tool(tool_name, args))}
+
+                    if parser.complete:
+                        break
+
+                    if streaming_reply:
+                        self._emit_stream(self._reply_preview(response_text, parser) or "")
+                        continue
+
+                    title = parser.partial("title")
+                    if title:
+                        status.update(f"[bold purple]{title}[/bold purple]")
+
+                    reply = self._reply_preview(response_text, parser)
+                    if reply and self.on_stream:
+                        status.stop()
+                        streaming_reply = True
+                        self._emit_stream(reply)
+        except BaseException:
+            if early: early["task"].cancel()
+            raise
+        return response_text, early
+
+    async def _execute_tool(self, tool_name: str, args: dict):
+        if not hasattr(self, 'current_worker'):
+            self.current_worker = self._spawn_agent(self.current_role)
+
+        if tool_name in self.current_worker.tools:
+            return await tool_dispatcher.run(tool_name, self.current_worker.tools[tool_name], args)
+        elif self.settings.mcp_enabled and tool_name in self.mcp.tools_map:
+            return await self.mcp.execute_tool(tool_name, args)
+        return f"Error: Tool '{tool_name}' not found or permission denied for role '{self.current_role}'."
+
     def _trim_history(self):
-        limit = max(self.settings.history_limit, 50)
-        if len(self.history) > limit:
-            self.history = [self.history[0]] + self.history[-limit:]
+        self.history, _ = self.history_manager.fit(self.history)
 
     def _spawn_agent(self, role_name: str) -> BaseAgent:
         target_role = role_name if role_name != "system" else self.current_role
@@ -80,7 +171,8 @@ class Orchestrator:
             name=role_config.name.capitalize(),
             provider=self.brain,
             skill_name=target_role,
-            settings=self.settings
+            settings=self.settings,
+            mcp=self.mcp
         )
         
         from src.config import MODES
@@ -113,26 +205,27 @@ class Orchestrator:
 
         while step < self.max_steps:
             self._trim_history()
+            request_mode.set(self.current_mode)
             
-            role_cfg = load_role(self.current_role) or load_role("system")
-            system_prompt = self._build_system_prompt(role_cfg)
-            
-            from src.config import MODES
-            mode_def = MODES.get(self.current_mode, MODES["BUILD"])
-            full_prompt = f"{system_prompt}\n\n=== CURRENT FOCUS: {mode_def['prompt']} ==="
+            full_prompt = self._build_system_prompt()
 
             response_text = ""
+            early = None
             try:
-                with console.status(f"[bold purple]{self.last_title}[/bold purple]", spinner="dots"):
-                    response_text = await self.brain.generate_text(self.history, full_prompt)
+                with console.status(f"[bold purple]{self.last_title}[/bold purple]", spinner="dots") as status:
+                    response_text, early = await self._stream_response(full_prompt, status)
                     from src.utils import print_token_usage
-                    print_token_usage(self.history + [{"content": full_prompt}], response_text)
+                    request, usage = self.history + [{"content": full_prompt}], self.brain.last_usage
+                    self.history_manager.record_usage(request, usage)
+                    print_token_usage(request, response_text, usage, active_model(self.settings))
             except Exception as e:
+                self._emit_stream(None)
                 return f"Critical Brain Failure: {e}"
 
             json_str = extract_json_from_text(response_text)
 
             if not json_str:
+                if early: early["task"].cancel()
                 self.history.append({"role": "assistant", "content": response_text})
                 return response_text
 
@@ -142,12 +235,29 @@ class Orchestrator:
                 self.last_title = data.get("title", "Thinking...")
                 tool_name = data.get("tool")
                 args = data.get("args", {})
+                calls = parse_calls(data) if not tool_name else None
+
+                if calls or tool_name not in ("response", None):
+                    self._emit_stream(None)
+
+                if early and (early["tool"], early["args"]) != (tool_name, args):
+                    early["task"].cancel()
+                    early = None
 
                 if self.settings.debug_mode:
                     console.print(Panel("\n".join(thoughts), title=f"[dim]🧠 {self.last_title}[/dim]", border_style="dim cyan"))
                 else:
                     console.print(f"[dim purple]→ {self.last_title}[/dim purple]")
 
+                if calls:
+                    results = await run_calls(calls, self._execute_tool, self.settings.tools.max_parallel)
+                    self.history.append({"role": "assistant", "content": json_str})
+                    observed = self.history_manager.observe(self.history, calls, results, 5000)
+                    self.history.append({"role": "user", "content": f"OBSERVATIONS:\n{format_observations(calls, observed, None)}"})
+                    memory_core.log_event("system", {"calls": [c[0] for c in calls], "results": results}, "tool_execution")
+                    step += 1
+                    continue
+
                 if tool_name == "set_state":
                     new_role = args.get("role")
                     new_mode = args.get("mode")
@@ -164,27 +274,20 @@ class Orchestrator:
                     self.history.append({"role": "assistant", "content": json_str})
                     return str(final_text)
 
-                result = ""
-                
-                if not hasattr(self, 'current_worker'):
-                    self.current_worker = self._spawn_agent(self.current_role)
-                
-                if tool_name in self.current_worker.tools:
-                    func = self.current_worker.tools[tool_name]
-                    import inspect
-                    result = await func(**args) if inspect.iscoroutinefunction(func) else func(**args)
-                elif self.settings.mcp_enabled and tool_name in self.mcp.tools_map:
-                    result = await self.mcp.execute_tool(tool_name, args)
+                if early:
+                    result = await early["task"]
                 else:
-                    result = f"Error: Tool '{tool_name}' not found or permission denied for role '{self.current_role}'."
+                    result = await self._execute_tool(tool_name, args)
 
+                observed = self.history_manager.observe(self.history, [(tool_name, args)], [result], 5000)[0]
                 self.history.append({"role": "assistant", "content": json_str})
-                self.history.append({"role": "user", "content": f"OBSERVATION: {str(result)[:5000]}"})
+                self.history.append({"role": "user", "content": f"OBSERVATION: {observed}"})
                 memory_core.log_event("system", {"tool": tool_name, "result": result}, "tool_execution")
                 
                 step += 1
 
             except Exception as e:
+                self._emit_stream(None)
                 self.history.append({"role": "user", "content": f"SYSTEM ERROR: {e}"})
                 step += 1
 
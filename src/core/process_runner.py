@@ -0,0 +1,167 @@
+import asyncio
+import os
+import signal
+import subprocess
+from collections import deque
+from typing import Callable, Optional
+
+class OutputBuffer:
+    """
+    Keeps the first `head_bytes` and the last `tail_bytes` of a stream; everything
+    in between is counted but dropped, so memory stays bounded for any output size.
+    """
+    def __init__(self, head_bytes: int = 8192, tail_bytes: int = 24576):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail: deque = deque()
+        self.tail_size = 0
+        self.omitted = 0
+        self.total = 0
+
+    def feed(self, data: bytes):
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail_size > self.tail_bytes:
+            overflow = self.tail_size - self.tail_bytes
+            first = self.tail[0]
+            if len(first) <= overflow:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+                self.omitted += len(first)
+            else:
+                self.tail[0] = first[overflow:]
+                self.tail_size -= overflow
+                self.omitted += overflow
+
+    def text(self) -> str:
+        head = bytes(self.head).decode("utf-8", errors="replace")
+        tail = b"".join(self.tail).decode("utf-8", errors="replace")
+        if self.omitted:
+            return f"{head}\n... [{self.omitted} bytes omitted] ...\n{tail}"
+        return head + tail
+
+class LineEmitter:
+    """Turns arbitrary chunks into complete lines for an on_output callback."""
+    def __init__(self, callback: Optional[Callable[[str], None]], max_line: int = 4096):
+        self.callback = callback
+        self.max_line = max_line
+        self.pending = b""
+
+    def feed(self, data: bytes):
+        if not self.callback:
+            return
+        self.pending += data
+        *lines, self.pending = self.pending.split(b"\n")
+        if len(self.pending) > self.max_line:
+            lines.append(self.pending)
+            self.pending = b""
+        for line in lines:
+            self.callback(line.decode("utf-8", errors="replace").rstrip("\r"))
+
+    def close(self):
+        if self.callback and self.pending:
+            self.callback(self.pending.decode("utf-8", errors="replace"))
+        self.pending = b""
+
+class ProcessResult:
+    def __init__(self, exit_code: Optional[int], output: str, timed_out: bool = False, omitted: int = 0):
+        self.exit_code = exit_code
+        self.output = output
+        self.timed_out = timed_out
+        self.omitted = omitted
+
+def _with_limits(command: str, cpu_seconds: int, memory_mb: int) -> str:
+    """
+    Prefixes a POSIX shell command with ulimit calls for CPU time and data size. The shell
+    applies them to itself before running the command, so no preexec_fn runs in the forked
+    child (unsafe while this process has other threads).
+    """
+    prefix = []
+    if cpu_seconds:
+        prefix.append(f"ulimit -S -t {cpu_seconds} && ulimit -H -t {cpu_seconds + 5}")
+    if memory_mb:
+        prefix.append(f"ulimit -d {memory_mb * 1024}")
+    if not prefix:
+        return command
+    return " && ".join(prefix) + " || exit 126\n" + command
+
+def _kill_tree(proc: asyncio.subprocess.Process):
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+async def run_process(
+    command: str,
+    timeout: float = 120,
+    cpu_seconds: int = 0,
+    memory_mb: int = 0,
+    head_bytes: int = 8192,
+    tail_bytes: int = 24576,
+    on_output: Optional[Callable[[str], None]] = None,
+    cwd: Optional[str] = None
+) -> ProcessResult:
+    """
+    Runs a shell command with stdout and stderr merged, streaming lines to `on_output`
+    while keeping only a bounded head/tail of the output. The whole process tree is
+    killed on timeout or cancellation.
+    """
+    kwargs = {}
+    if os.name != "nt":
+        kwargs["start_new_session"] = True
+        command = _with_limits(command, cpu_seconds, memory_mb)
+
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        cwd=cwd,
+        **kwargs
+    )
+    buffer = OutputBuffer(head_bytes, tail_bytes)
+    lines = LineEmitter(on_output)
+
+    async def pump():
+        while True:
+            chunk = await proc.stdout.read(4096)
+            if not chunk:
+                break
+            buffer.feed(chunk)
+            lines.feed(chunk)
+        await proc.wait()
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        _kill_tree(proc)
+    except BaseException:
+        _kill_tree(proc)
+        raise
+    finally:
+        lines.close()
+
+    if timed_out:
+        try:
+            await asyncio.wait_for(proc.wait(), 5)
+        except Exception:
+            pass
+    return ProcessResult(proc.returncode, buffer.text(), timed_out, buffer.omitted)
@@ -1,12 +1,66 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+def chat_usage(usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    """OpenAI-style usage (prompt/completion tokens) under the input/output keys used across providers."""
+    if not usage or usage.get("prompt_tokens") is None:
+        return None
+    return {"input_tokens": usage["prompt_tokens"], "output_tokens": usage.get("completion_tokens") or 0}
+
+class ProviderHTTPError(Exception):
+    """Non-200 response from a provider API, with the status and the server's Retry-After delay."""
+    def __init__(self, provider: str, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} HTTP {status_code}: {detail}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, provider: str, response, detail: str) -> "ProviderHTTPError":
+        return cls(provider, response.status_code, detail, parse_retry_after(response.headers.get("retry-after")))
+
+    @property
+    def retryable(self) -> bool:
+        # Other client errors (bad key, bad request) fail the same way on every attempt.
+        return self.status_code in (408, 409, 425, 429) or self.status_code >= 500
+
+class SystemPrompt(str):
+    """
+    A system prompt split into a stable prefix and a volatile per-step suffix.
+    Behaves as the joined string for providers without prompt caching.
+    """
+    def __new__(cls, static: str, dynamic: str = ""):
+        prompt = super().__new__(cls, f"{static}\n\n{dynamic}" if dynamic else static)
+        prompt.static = static
+        prompt.dynamic = dynamic
+        return prompt
 
 class AIProvider(ABC):
-    
+    last_usage: Optional[Dict[str, int]] = None
+
     @abstractmethod
     async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
         pass
 
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        """Yields the completion as text deltas. Providers without streaming yield it whole."""
+        yield await self.generate_text(history, system_prompt)
+
     @abstractmethod
     async def generate_image(self, prompt: str) -> str:
         pass
@@ -1,81 +1,250 @@
-import docker
+import atexit
 import os
-import tarfile
-import io
-from pathlib import Path
-from typing import Optional
+import textwrap
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from src.config import SandboxSettings
+from src.core.process_runner import OutputBuffer, LineEmitter
+
+POOL_LABEL = "zervgen.sandbox"
 
 class SandboxManager:
-    def __init__(self, image: str = "python:3.11-slim", timeout: int = 30):
-        self.image = image
-        self.timeout = timeout
+    """
+    Runs untrusted Python in network-isolated containers taken from a warm pool.
+    Each container has a tmpfs working directory (/app) that is wiped after every
+    run; the host workspace is mounted at /workspace for files that should persist.
+    Idle containers beyond `max_idle` seconds are retired, and a container that fails
+    its health check or times out is replaced instead of being reused. A background
+    maintenance thread retires stale containers and refills the pool, so the first run
+    after a quiet period still finds a warm container.
+    """
+    def __init__(self, settings: Optional[SandboxSettings] = None):
+        self.settings = settings
         self.client = None
+        self._connected = False
+        self._idle: List[Tuple[float, object]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Updated from run and maintenance threads; always under self._lock.
+        self.stats = {"created": 0, "reused": 0, "replaced": 0, "retired": 0}
+
+    @property
+    def image(self) -> str:
+        return self._settings().image
+
+    def _settings(self) -> SandboxSettings:
+        if self.settings is None:
+            from src.config import get_settings
+            self.settings = get_settings().sandbox
+        return self.settings
+
+    def _connect(self):
+        """Connects to the Docker daemon (and pulls the image) on first use rather than at import."""
+        if self._connected:
+            return
+        self._connected = True
         try:
+            import docker
             self.client = docker.from_env()
             self.client.ping()
-            print(f"[Sandbox] Docker Connected. Pulling {image}...")
+            print(f"[Sandbox] Docker Connected. Pulling {self.image}...")
             try:
-                self.client.images.pull(image)
+                self.client.images.pull(self.image)
             except:
-                print(f"[Sandbox] Warning: Could not pull {image}, trying local...")      
+                print(f"[Sandbox] Warning: Could not pull {self.image}, trying local...")
         except Exception as e:
-            return
-            print(f"[Sandbox] Docker Error: {e}")
-            print("[Sandbox] TIP: Ensure Docker Desktop is running and 'Expose daemon on tcp://localhost:2375' is OFF (or configured correctly).")
             self.client = None
+            return
+
+        self._remove_orphans()
+        atexit.register(self.shutdown)
+        threading.Thread(target=self._fill, name="sandbox-prewarm", daemon=True).start()
+        threading.Thread(target=self._maintain, name="sandbox-maintain", daemon=True).start()
 
     def is_active(self):
+        self._connect()
         return self.client is not None
 
-    def execute(self, code: str, work_dir: str = "./tmp/workspace") -> str:
+    def _remove_orphans(self):
+        """Removes pool containers left behind by a previous process that did not shut down cleanly."""
+        try:
+            for container in self.client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                container.remove(force=True)
+        except Exception:
+            pass
+
+    def _create(self):
+        cfg = self._settings()
+        abs_work_dir = os.path.abspath(cfg.work_dir)
+        os.makedirs(abs_work_dir, exist_ok=True)
+        container = self.client.containers.run(
+            cfg.image,
+            command="sleep infinity",
+            working_dir="/app",
+            tmpfs={"/app": f"rw,size={cfg.tmpfs_size}"},
+            volumes={abs_work_dir: {'bind': '/workspace', 'mode': 'rw'}},
+            labels={POOL_LABEL: "1"},
+            detach=True,
+            mem_limit=cfg.mem_limit,
+            pids_limit=cfg.pids_limit,
+            network_mode="none"
+        )
+        self._count("created")
+        return container
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    if len(self._idle) >= self._settings().pool_size:
+                        return
+                container = self._create()
+                with self._lock:
+                    full = len(self._idle) >= self._settings().pool_size
+                    if not full:
+                        self._idle.append((time.monotonic(), container))
+                if full:
+                    self._discard(container)
+                    return
+        except Exception:
+            pass
+
+    @staticmethod
+    def _healthy(container) -> bool:
+        try:
+            container.reload()
+            return container.status == "running"
+        except Exception:
+            return False
+
+    def _discard(self, container):
+        try:
+            container.remove(force=True)
+        except Exception:
+            pass
+
+    def _retire_idle(self):
+        cutoff = time.monotonic() - self._settings().max_idle
+        with self._lock:
+            stale = [c for t, c in self._idle if t < cutoff]
+            self._idle = [(t, c) for t, c in self._idle if t >= cutoff]
+            self.stats["retired"] += len(stale)
+        for container in stale:
+            self._discard(container)
+
+    def _maintain(self):
+        """Retires containers idle past max_idle and refills the pool, off the request path."""
+        interval = max(1.0, min(self._settings().max_idle / 2, 60.0))
+        while not self._stop.wait(interval):
+            try:
+                self._retire_idle()
+                self._fill()
+            except Exception:
+                pass
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                _, container = self._idle.pop()
+            if self._healthy(container):
+                self._count("reused")
+                return container
+            self._count("replaced")
+            self._discard(container)
+        return self._create()
+
+    def _release(self, container, reusable: bool):
+        if reusable:
+            try:
+                reset = container.exec_run(["sh", "-c", "rm -rf /app/* /app/.[!.]* /app/..?* 2>/dev/null; true"])
+                reusable = reset.exit_code == 0
+            except Exception:
+                reusable = False
+
+        with self._lock:
+            keep = reusable and len(self._idle) < self._settings().pool_size
+            if keep:
+                self._idle.append((time.monotonic(), container))
+        if not keep:
+            self._discard(container)
+            threading.Thread(target=self._fill, name="sandbox-refill", daemon=True).start()
+
+    def _exec_streaming(self, container, cmd: List[str], on_output: Optional[Callable[[str], None]]):
+        """exec via the low-level API so output arrives incrementally and stays bounded."""
+        cfg = self._settings()
+        api = self.client.api
+        exec_id = api.exec_create(container.id, cmd, workdir="/app")["Id"]
+        buffer = OutputBuffer(cfg.output_head_kb * 1024, cfg.output_tail_kb * 1024)
+        lines = LineEmitter(on_output)
+        for chunk in api.exec_start(exec_id, stream=True):
+            buffer.feed(chunk)
+            lines.feed(chunk)
+        lines.close()
+        return api.exec_inspect(exec_id).get("ExitCode"), buffer.text()
+
+    def execute(self, code: str, on_output: Optional[Callable[[str], None]] = None) -> str:
         """
-        Runs Python code in a disposable container.
-        Mounts 'work_dir' to /app so files persist if needed.
+        Runs Python code in a pooled container (safe to call from several threads).
+        /app is a scratch tmpfs wiped after the run; write to /workspace to keep files.
+        Output lines are passed to `on_output` as they are produced.
         """
+        self._connect()
         if not self.client:
             return "Error: Docker not available. Cannot execute safely."
-        
-        abs_work_dir = os.path.abspath(work_dir)
-        os.makedirs(abs_work_dir, exist_ok=True)
+
+        wrapped_code = (
+            "import sys\n"
+            "try:\n"
+            f"{textwrap.indent(code, '    ')}\n"
+            "    pass\n"
+            "except Exception as e:\n"
+            "    print(f\"Runtime Error: {e}\", file=sys.stderr)\n"
+        )
 
         container = None
+        reusable = False
         try:
-            container = self.client.containers.run(
-                self.image,
-                command="sleep infinity",
-                working_dir="/app",
-                volumes={abs_work_dir: {'bind': '/app', 'mode': 'rw'}},
-                detach=True,
-                mem_limit="512m",
-                network_mode="none"
+            container = self._acquire()
+            exit_code, output = self._exec_streaming(
+                container,
+                ["timeout", "-s", "KILL", str(self._settings().timeout), "python", "-u", "-c", wrapped_code],
+                on_output
             )
-            wrapped_code = f"""
-import sys
-try:
-{'\n'.join(['    ' + line for line in code.splitlines()])}
-except Exception as e:
-    print(f"Runtime Error: {{e}}", file=sys.stderr)
-"""
-            
-            exec_result = container.exec_run(
-                ["python", "-c", wrapped_code],
-                workdir="/app"
-            )
-            
-            output = exec_result.output.decode("utf-8")
-            
-            if exec_result.exit_code != 0:
-                return f"[EXIT CODE {exec_result.exit_code}]\n{output}"
-            
+            # A killed run may leave processes behind; only clean exits are recycled.
+            reusable = exit_code in (0, 1)
+
+            if exit_code == 137:
+                return f"[TIMEOUT after {self._settings().timeout}s or killed]\n{output}"
+            if exit_code != 0:
+                return f"[EXIT CODE {exit_code}]\n{output}"
+
             return output if output.strip() else "[Success: No Output]"
 
         except Exception as e:
             return f"Sandbox Exception: {e}"
-            
+
         finally:
-            if container:
-                try:
-                    container.remove(force=True)
-                except: pass
+            if container is not None:
+                self._release(container, reusable)
+
+    def report(self) -> str:
+        with self._lock:
+            idle = len(self._idle)
+            stats = dict(self.stats)
+        return f"Idle: {idle} | " + " | ".join(f"{k}: {v}" for k, v in stats.items())
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, container in idle:
+            self._discard(container)
 
-sandbox = SandboxManager()
\ No newline at end of file
+sandbox = SandboxManager()
@@ -0,0 +1,112 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Tuple, Iterable
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if len(t) > 1 or t.isdigit()]
+
+class BM25Index:
+    """
+    Incrementally maintained inverted index with Okapi BM25 ranking.
+    Only the forward index (doc -> term frequencies) is persisted; postings
+    are rebuilt from it on load without re-tokenizing the documents.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict[str, int]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, doc_id: str):
+        return doc_id in self.docs
+
+    def add(self, doc_id: str, text: str):
+        self._add_terms(doc_id, dict(Counter(tokenize(text))))
+        self.dirty = True
+
+    def _add_terms(self, doc_id: str, terms: Dict[str, int]):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        self.docs[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_len[doc_id] = length
+        self.total_len += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: str):
+        terms = self.docs.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.dirty = True
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        terms = set(tokenize(query))
+        n_docs = len(self.docs)
+        if not terms or not n_docs:
+            return []
+
+        avg_len = self.total_len / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def sync(self, documents: Iterable[Tuple[str, str]]):
+        """Adds documents missing from the index and drops ids that no longer exist."""
+        seen = set()
+        for doc_id, text in documents:
+            seen.add(doc_id)
+            if doc_id not in self.docs:
+                self.add(doc_id, text)
+        for doc_id in [d for d in self.docs if d not in seen]:
+            self.remove(doc_id)
+
+    def save(self, path: Path):
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.docs}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        index = cls()
+        if not path.exists():
+            return index
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index.k1 = data.get("k1", index.k1)
+            index.b = data.get("b", index.b)
+            for doc_id, terms in data.get("docs", {}).items():
+                index._add_terms(doc_id, terms)
+        except Exception:
+            return cls()
+        return index
@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, IO, List, Tuple
+
+class SessionLogWriter:
+    """
+    Background writer for session .jsonl logs. write() only enqueues the line;
+    a daemon thread drains the bounded queue and appends lines in batches.
+
+    fsync policy: "never" (leave it to the OS), "batch" (once per written batch)
+    or "event" (after every line).
+    """
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256, flush_interval: float = 0.5, fsync: str = "batch"):
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.errors = 0
+        self._handles: Dict[Path, IO] = {}
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, path: Path, line: str):
+        if self._closed:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+            return
+        self._ensure_thread()
+        # Blocks when the queue is full so a runaway producer cannot grow memory unbounded.
+        self.queue.put((path, line))
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            self._write_batch([entry for entry in batch if entry is not None])
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Tuple[Path, str]]):
+        touched = {}
+        for path, line in batch:
+            try:
+                handle = self._handles.get(path)
+                if handle is None:
+                    handle = open(path, "a", encoding="utf-8")
+                    self._handles[path] = handle
+                handle.write(line)
+                touched[path] = handle
+                if self.fsync == "event":
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            except Exception:
+                self.errors += 1
+
+        for handle in touched.values():
+            try:
+                handle.flush()
+                if self.fsync == "batch":
+                    os.fsync(handle.fileno())
+            except Exception:
+                self.errors += 1
+
+    def flush(self):
+        """Blocks until every queued line has been written."""
+        if self._thread and self._thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+        for handle in self._handles.values():
+            try:
+                handle.close()
+            except Exception:
+                pass
+        self._handles.clear()
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import weakref
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+# Tools that mutate a file: calls on the same path run one after another, in request order.
+WRITE_TOOLS = frozenset({"write_file", "append_file"})
+
+# Held or awaited locks stay referenced by their callers; idle ones drop out of the map.
+_path_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _path_lock(path: str) -> asyncio.Lock:
+    key = os.path.normcase(os.path.abspath(path))
+    lock = _path_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _path_locks[key] = lock
+    return lock
+
+def parse_calls(data: dict) -> Optional[List[Tuple[str, dict]]]:
+    """Returns the (tool, args) pairs of a multi-call action, or None for a single-tool action."""
+    calls = data.get("calls")
+    if not isinstance(calls, list) or not calls:
+        return None
+    parsed = []
+    for call in calls:
+        if isinstance(call, dict) and call.get("tool"):
+            args = call.get("args")
+            parsed.append((str(call["tool"]), args if isinstance(args, dict) else {}))
+    return parsed or None
+
+async def run_calls(
+    calls: List[Tuple[str, dict]],
+    execute: Callable[[str, dict], Awaitable[Any]],
+    max_parallel: int = 4
+) -> List[Any]:
+    """
+    Runs all calls concurrently (at most `max_parallel` at a time) and returns their
+    results in request order. A failing call yields an error string instead of
+    aborting the batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def run_one(tool_name: str, args: dict):
+        path = args.get("path") if tool_name in WRITE_TOOLS else None
+        try:
+            if isinstance(path, str) and path:
+                async with _path_lock(path):
+                    async with semaphore:
+                        return await execute(tool_name, args)
+            async with semaphore:
+                return await execute(tool_name, args)
+        except Exception as e:
+            return f"Error: {e}"
+
+    return await asyncio.gather(*(run_one(tool_name, args) for tool_name, args in calls))
+
+def _describe(tool_name: str, args: dict, limit: int = 120) -> str:
+    text = json.dumps(args, ensure_ascii=False)
+    return f"{tool_name} {text[:limit] + '...' if len(text) > limit else text}"
+
+def format_observations(calls: List[Tuple[str, dict]], results: List[Any], max_chars: Optional[int]) -> str:
+    """One ordered block: a numbered header per call followed by its (truncated) result."""
+    blocks = []
+    for i, ((tool_name, args), result) in enumerate(zip(calls, results), 1):
+        text = str(result)
+        if max_chars and len(text) > max_chars:
+            text = text[:max_chars] + "... [TRUNCATED]"
+        blocks.append(f"[{i}] {_describe(tool_name, args)}\n{text}")
+    return "\n\n".join(blocks)
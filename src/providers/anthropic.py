@@ -1,12 +1,13 @@
 import httpx
 import json
-from typing import List, Dict
-from src.core.provider import AIProvider
-from src.config import AnthropicSettings
-from src.utils import async_retry
+from typing import List, Dict, Optional, AsyncIterator
+from src.core.provider import AIProvider, ProviderHTTPError, SystemPrompt
+from src.core.http_pool import get_client, iter_sse_json
+from src.config import AnthropicSettings, HTTPSettings
+from src.utils import async_retry, stream_retry
 
 class AnthropicProvider(AIProvider):
-    def __init__(self, settings: AnthropicSettings):
+    def __init__(self, settings: AnthropicSettings, http: Optional[HTTPSettings] = None):
         self.settings = settings
         if not self.settings.api_key:
             raise ValueError("Anthropic API Key is not set.")
@@ -17,56 +18,120 @@ class AnthropicProvider(AIProvider):
             "anthropic-version": "2023-06-01",
             "Content-Type": "application/json"
         }
+        self.http = http or HTTPSettings()
+        self.client = get_client("anthropic", self.http)
 
-    @async_retry(retries=3, delays=[2, 5, 10])
-    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+    def _build_payload(self, history: List[Dict], system_prompt: str) -> Dict:
+        """
+        Caches the static system prefix and the two latest user turns. The volatile
+        part of a SystemPrompt goes after the last breakpoint so it never busts the cache.
+        """
         messages = []
         for msg in history:
-            messages.append({"role": msg.get("role"), "content": msg.get("content", "")})
-        
-        payload = {
+            role = "assistant" if msg.get("role") == "assistant" else "user"
+            text = str(msg.get("content", "")) or "(empty)"
+            messages.append({"role": role, "content": [{"type": "text", "text": text}]})
+
+        user_turns = [i for i, m in enumerate(messages) if m["role"] == "user"]
+        for i in user_turns[-2:]:
+            messages[i]["content"][-1]["cache_control"] = {"type": "ephemeral"}
+
+        static = system_prompt.static if isinstance(system_prompt, SystemPrompt) else system_prompt
+        dynamic = system_prompt.dynamic if isinstance(system_prompt, SystemPrompt) else ""
+        if dynamic:
+            block = {"type": "text", "text": dynamic}
+            if messages and messages[-1]["role"] == "user":
+                messages[-1]["content"].append(block)
+            else:
+                messages.append({"role": "user", "content": [block]})
+
+        return {
             "model": self.settings.model,
             "messages": messages,
-            "system": system_prompt,
+            "system": [{"type": "text", "text": static, "cache_control": {"type": "ephemeral"}}],
             "max_tokens": 4096,
             "temperature": 0.7
         }
+
+    def _record_usage(self, usage: Dict):
+        if not usage:
+            return
+        current = self.last_usage or {}
+        for key in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+            if usage.get(key) is not None:
+                current[key] = usage[key]
+        self.last_usage = current
+
+    @async_retry(retries=3, delays=[2, 5, 10])
+    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        self.last_usage = None
+        payload = self._build_payload(history, system_prompt)
         
-        async with httpx.AsyncClient() as client:
+        try:
+            resp = await self.client.post(self.base_url, headers=self.headers, json=payload)
+            
+            if resp.status_code != 200:
+                error_text = resp.text
+                try:
+                    err_json = resp.json()
+                    if "error" in err_json:
+                        error_text = json.dumps(err_json["error"])
+                except: pass
+                raise ProviderHTTPError.from_response("Anthropic", resp, error_text)
+            
             try:
-                resp = await client.post(self.base_url, headers=self.headers, json=payload, timeout=60)
-                
+                data = resp.json()
+            except json.JSONDecodeError:
+                raise Exception(f"Anthropic returned invalid JSON: {resp.text[:200]}")
+            
+            if "error" in data:
+                raise Exception(f"Anthropic API Error: {data['error']}")
+            
+            self._record_usage(data.get("usage"))
+
+            if "content" not in data or not data["content"]:
+                raise Exception(f"Anthropic returned empty content. Raw response: {data}")
+            
+            content = data['content'][0]['text'] if data['content'] else ""
+            
+            if not content:
+                raise Exception("Anthropic returned empty content string.")
+            
+            return content
+            
+        except httpx.TimeoutException:
+            raise Exception(f"Anthropic Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
+        except Exception as e:
+            raise e
+
+    @stream_retry(retries=3, delays=[2, 5, 10])
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        self.last_usage = None
+        payload = self._build_payload(history, system_prompt)
+        payload["stream"] = True
+
+        try:
+            async with self.client.stream("POST", self.base_url, headers=self.headers, json=payload) as resp:
                 if resp.status_code != 200:
-                    error_text = resp.text
-                    try:
-                        err_json = resp.json()
-                        if "error" in err_json:
-                            error_text = json.dumps(err_json["error"])
-                    except: pass
-                    raise Exception(f"Anthropic HTTP {resp.status_code}: {error_text}")
-                
-                try:
-                    data = resp.json()
-                except json.JSONDecodeError:
-                    raise Exception(f"Anthropic returned invalid JSON: {resp.text[:200]}")
-                
-                if "error" in data:
-                    raise Exception(f"Anthropic API Error: {data['error']}")
-                
-                if "content" not in data or not data["content"]:
-                    raise Exception(f"Anthropic returned empty content. Raw response: {data}")
-                
-                content = data['content'][0]['text'] if data['content'] else ""
-                
-                if not content:
-                    raise Exception("Anthropic returned empty content string.")
-                
-                return content
-                
-            except httpx.TimeoutException:
-                raise Exception("Anthropic Timeout (60s). The model is too slow or down.")
-            except Exception as e:
-                raise e
+                    await resp.aread()
+                    raise ProviderHTTPError.from_response("Anthropic", resp, resp.text[:500])
+
+                async for event in iter_sse_json(resp):
+                    event_type = event.get("type")
+                    if event_type == "error":
+                        raise Exception(f"Anthropic API Error: {event.get('error')}")
+                    if event_type == "message_start":
+                        self._record_usage(event.get("message", {}).get("usage"))
+                    elif event_type == "message_delta":
+                        self._record_usage(event.get("usage"))
+                    elif event_type == "content_block_delta":
+                        delta = event.get("delta", {})
+                        if delta.get("type") == "text_delta" and delta.get("text"):
+                            yield delta["text"]
+                    elif event_type == "message_stop":
+                        return
+        except httpx.TimeoutException:
+            raise Exception(f"Anthropic Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
 
     async def generate_image(self, prompt: str) -> str:
         return "Anthropic does not support direct image generation. Use Pollinations."
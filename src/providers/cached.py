@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import aclosing
+from contextvars import ContextVar
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+from src.config import ResponseCacheSettings
+from src.core.provider import AIProvider
+
+CACHE_DIR = Path("tmp") / "cache"
+CACHE_FILE = CACHE_DIR / "responses.db"
+SEMANTIC_COLLECTION = "zervgen_response_cache"
+
+# Mode of the request being served; the orchestrator sets it each step. Unset means settings.mode.
+request_mode: ContextVar[Optional[str]] = ContextVar("request_mode", default=None)
+# Whether the caller's last request was served from the cache. A ContextVar rather than an
+# attribute, because concurrent agents (delegate_many) share one CachedProvider.
+_last_hit: ContextVar[bool] = ContextVar("cache_last_hit", default=False)
+
+class ResponseStore:
+    """SQLite table of completions with TTL expiry and least-recently-used eviction."""
+    def __init__(self, path: Path, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str) -> List[str]:
+        """Stores a response; returns the keys evicted to stay within max_entries or TTL."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            evicted = [r[0] for r in self.conn.execute("SELECT key FROM responses WHERE created < ?", (now - self.ttl_seconds,))]
+            overflow = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - len(evicted) - self.max_entries
+            if overflow > 0:
+                evicted += [r[0] for r in self.conn.execute(
+                    "SELECT key FROM responses WHERE created >= ? ORDER BY accessed LIMIT ?", (now - self.ttl_seconds, overflow)
+                )]
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in evicted])
+            self.conn.commit()
+            return evicted
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_stores: Dict[str, ResponseStore] = {}
+
+def _store(settings: ResponseCacheSettings) -> ResponseStore:
+    """One store (and SQLite connection) per process, shared by every cached provider."""
+    key = str(CACHE_FILE)
+    if key not in _stores:
+        _stores[key] = ResponseStore(CACHE_FILE, settings.ttl_seconds, settings.max_entries)
+    return _stores[key]
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class CachedProvider(AIProvider):
+    """
+    Response cache in front of another provider's text generation. The exact layer keys on
+    (model, static system prompt, history): the per-step context suffix of a SystemPrompt
+    (clock, recent memories) is left out so identical turns can hit. The optional semantic
+    layer matches the question that opens a turn against earlier ones in the memory Chroma
+    store, scoped to the same model, static prompt and preceding assistant reply, so a bare
+    follow-up ("yes", "continue") only matches after the same reply. Images, audio and
+    vision are passed through.
+    """
+    def __init__(self, inner: AIProvider, model: str, settings: ResponseCacheSettings, default_mode: str = "BUILD"):
+        self.inner = inner
+        self.model = model
+        self.settings = settings
+        self.default_mode = default_mode
+        self.store = _store(settings)
+        self._semantic = None
+        self._semantic_init = False
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    @property
+    def last_usage(self):
+        return {"input_tokens": 0, "output_tokens": 0} if _last_hit.get() else self.inner.last_usage
+
+    def _mode(self) -> str:
+        return (request_mode.get() or self.default_mode).upper()
+
+    def _enabled(self) -> bool:
+        return self._mode() in {m.upper() for m in self.settings.modes}
+
+    def _scope(self, system_prompt: str) -> str:
+        return _hash(self.model, getattr(system_prompt, "static", system_prompt))
+
+    def _key(self, history: List[Dict], system_prompt: str) -> str:
+        return _hash(self._scope(system_prompt), [(m.get("role"), str(m.get("content", ""))) for m in history])
+
+    def _question(self, history: List[Dict]) -> Optional[str]:
+        """The user's question when it opens a turn (not a tool observation) in semantic-enabled modes."""
+        if not self.settings.semantic or self._mode() not in {m.upper() for m in self.settings.semantic_modes}:
+            return None
+        if not history or history[-1].get("role") != "user":
+            return None
+        text = str(history[-1].get("content", "")).strip()
+        if not text or text.startswith(("OBSERVATION", "TOOL RESULT", "SYSTEM", "SESSION DIGEST", "Error")):
+            return None
+        return text
+
+    def _semantic_scope(self, history: List[Dict], system_prompt: str) -> str:
+        """Model and static prompt plus the assistant reply the question answers, if any."""
+        previous = next((str(m.get("content", "")) for m in reversed(history[:-1]) if m.get("role") == "assistant"), "")
+        return _hash(self._scope(system_prompt), previous)
+
+    def _collection(self):
+        if not self._semantic_init:
+            self._semantic_init = True
+            try:
+                from src.core.memory import memory_core
+                self._semantic = memory_core.vector_collection(SEMANTIC_COLLECTION)
+            except Exception:
+                self._semantic = None
+        return self._semantic
+
+    def _semantic_lookup(self, question: str, scope: str) -> Optional[str]:
+        collection = self._collection()
+        if collection is None:
+            return None
+        try:
+            found = collection.query(query_texts=[question], n_results=1, where={"scope": scope})
+            ids, distances = found["ids"][0], found["distances"][0]
+        except Exception:
+            return None
+        if not ids or distances[0] > self.settings.semantic_max_distance:
+            return None
+        response = self.store.get(ids[0])
+        if response is None:
+            self._semantic_forget([ids[0]])
+        return response
+
+    def _semantic_forget(self, keys: List[str]):
+        collection = self._collection()
+        if collection is not None and keys:
+            try:
+                collection.delete(ids=keys)
+            except Exception:
+                pass
+
+    def _semantic_add(self, key: str, question: str, scope: str):
+        collection = self._collection()
+        if collection is not None:
+            try:
+                collection.upsert(ids=[key], documents=[question], metadatas=[{"scope": scope}])
+            except Exception:
+                pass
+
+    async def _lookup(self, history: List[Dict], system_prompt: str):
+        """(cached response or None, hit, key, question, semantic scope) for this request."""
+        key = self._key(history, system_prompt)
+        response = await asyncio.to_thread(self.store.get, key)
+        if response is not None:
+            self.stats["hits"] += 1
+            return response, True, key, None, None
+
+        question = self._question(history)
+        scope = self._semantic_scope(history, system_prompt) if question else None
+        if question:
+            response = await asyncio.to_thread(self._semantic_lookup, question, scope)
+            if response is not None:
+                self.stats["semantic_hits"] += 1
+                return response, True, key, None, None
+        self.stats["misses"] += 1
+        return None, False, key, question, scope
+
+    async def _save(self, key: str, response: str, question: Optional[str], scope: Optional[str]):
+        if not response.strip():
+            return
+        evicted = await asyncio.to_thread(self.store.put, key, response)
+        if self.settings.semantic:
+            await asyncio.to_thread(self._semantic_forget, evicted)
+            if question:
+                await asyncio.to_thread(self._semantic_add, key, question, scope)
+
+    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        if not self._enabled():
+            _last_hit.set(False)
+            return await self.inner.generate_text(history, system_prompt)
+        cached, hit, key, question, scope = await self._lookup(history, system_prompt)
+        _last_hit.set(hit)
+        if hit:
+            return cached
+        response = await self.inner.generate_text(history, system_prompt)
+        await self._save(key, response, question, scope)
+        return response
+
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        if not self._enabled():
+            _last_hit.set(False)
+            async with aclosing(self.inner.stream_text(history, system_prompt)) as stream:
+                async for delta in stream:
+                    yield delta
+            return
+        cached, hit, key, question, scope = await self._lookup(history, system_prompt)
+        _last_hit.set(hit)
+        if hit:
+            yield cached
+            return
+        parts = []
+        async with aclosing(self.inner.stream_text(history, system_prompt)) as stream:
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+        # Only completions that streamed to the end are stored.
+        await self._save(key, "".join(parts), question, scope)
+
+    async def generate_image(self, prompt: str) -> str:
+        return await self.inner.generate_image(prompt)
+
+    async def generate_audio(self, text: str) -> bytes:
+        return await self.inner.generate_audio(text)
+
+    async def analyze_image(self, prompt: str, image_url: str) -> str:
+        return await self.inner.analyze_image(prompt, image_url)
+
+    def __getattr__(self, name):
+        # Provider-specific attributes (settings, client, ...) resolve on the wrapped provider.
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def report(self) -> str:
+        total = self.stats["hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        rate = (self.stats["hits"] + self.stats["semantic_hits"]) / total * 100 if total else 0.0
+        return (f"Hits: {self.stats['hits']} | Semantic hits: {self.stats['semantic_hits']} | "
+                f"Misses: {self.stats['misses']} ({rate:.0f}% hit rate) | Stored: {self.store.count()}")
@@ -0,0 +1,58 @@
+from typing import Optional
+from src.config import GlobalSettings
+from src.core.provider import AIProvider
+
+def build_provider(config: GlobalSettings, name: Optional[str] = None) -> AIProvider:
+    """
+    Constructs a provider by name (defaults to config.provider). Provider modules
+    are imported here rather than at module load, so SDK-heavy backends such as
+    google.generativeai are only imported when actually selected. With
+    response_cache enabled the provider is wrapped in a CachedProvider.
+    """
+    name = name or config.provider
+    provider = _build(config, name)
+    if config.response_cache.enabled:
+        from src.providers.cached import CachedProvider
+        provider_settings = getattr(config, name, None)
+        model = getattr(provider_settings, "model", None) or getattr(provider_settings, "text_model", "") or ""
+        if name == "router":
+            model = ",".join(config.router.backends)
+        provider = CachedProvider(provider, f"{name}:{model}", config.response_cache, config.mode)
+    return provider
+
+def _build_router(config: GlobalSettings) -> AIProvider:
+    from src.providers.router import RouterProvider
+    backends = {}
+    for spec in config.router.backends:
+        name, _, model = spec.partition(":")
+        provider_settings = getattr(config, name, None)
+        if name == "router" or provider_settings is None:
+            print(f"[Router] Unknown backend '{spec}', skipped.")
+            continue
+        if model:
+            field = "text_model" if name == "pollinations" else "model"
+            provider_settings = provider_settings.model_copy(update={field: model})
+        try:
+            backends[spec] = _build(config.model_copy(update={name: provider_settings}), name)
+        except Exception as e:
+            print(f"[Router] Backend '{spec}' unavailable: {e}")
+    return RouterProvider(backends, config.router)
+
+def _build(config: GlobalSettings, name: str) -> AIProvider:
+    if name == "router":
+        return _build_router(config)
+    elif name == "gemini":
+        from src.providers.gemini import GeminiProvider
+        return GeminiProvider(config.gemini)
+    elif name == "openrouter":
+        from src.providers.openrouter import OpenRouterProvider
+        return OpenRouterProvider(config.openrouter, config.http)
+    elif name == "openai":
+        from src.providers.openai import OpenAIProvider
+        return OpenAIProvider(config.openai, config.http)
+    elif name == "anthropic":
+        from src.providers.anthropic import AnthropicProvider
+        return AnthropicProvider(config.anthropic, config.http)
+
+    from src.providers.pollinations import PollinationsProvider
+    return PollinationsProvider(config.pollinations, config.http)
@@ -1,8 +1,8 @@
 import google.generativeai as genai
-from typing import List, Dict
+from typing import List, Dict, AsyncIterator
 from src.core.provider import AIProvider
 from src.config import GeminiSettings
-from src.utils import async_retry
+from src.utils import async_retry, stream_retry
 
 def fetch_available_models(api_key: str) -> List[str]:
     try:
@@ -25,17 +25,41 @@ class GeminiProvider(AIProvider):
         genai.configure(api_key=self.settings.api_key)
         self.model = genai.GenerativeModel(self.settings.model)
 
-    @async_retry()
-    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+    def _record_usage(self, response):
+        meta = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(meta, "prompt_token_count", None)
+        self.last_usage = None if prompt_tokens is None else {
+            "input_tokens": prompt_tokens, "output_tokens": getattr(meta, "candidates_token_count", 0) or 0
+        }
+
+    def _start_chat(self, history: List[Dict]):
         gemini_history = []
         for msg in history:
             role = "user" if msg["role"] == "user" else "model"
             gemini_history.append({"role": role, "parts": [msg["content"]]})
+        return self.model.start_chat(history=gemini_history)
 
-        chat = self.model.start_chat(history=gemini_history)
+    @async_retry()
+    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        chat = self._start_chat(history)
         response = await chat.send_message_async(f"System Instruction: {system_prompt}\n\nTask: Generate response.")
+        self._record_usage(response)
         return response.text
 
+    @stream_retry()
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        self.last_usage = None
+        chat = self._start_chat(history)
+        response = await chat.send_message_async(f"System Instruction: {system_prompt}\n\nTask: Generate response.", stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+        self._record_usage(response)
+
     async def generate_image(self, prompt: str) -> str:
         return "Gemini Image Gen not configured. Orchestrator should route this to Pollinations."
 
@@ -1,12 +1,13 @@
 import httpx
 import json
-from typing import List, Dict
-from src.core.provider import AIProvider
-from src.config import OpenAISettings
-from src.utils import async_retry
+from typing import List, Dict, Optional, AsyncIterator
+from src.core.provider import AIProvider, ProviderHTTPError, chat_usage
+from src.core.http_pool import get_client, iter_sse_json
+from src.config import OpenAISettings, HTTPSettings
+from src.utils import async_retry, stream_retry
 
 class OpenAIProvider(AIProvider):
-    def __init__(self, settings: OpenAISettings):
+    def __init__(self, settings: OpenAISettings, http: Optional[HTTPSettings] = None):
         self.settings = settings
         if not self.settings.api_key:
             raise ValueError("OpenAI API Key is not set.")
@@ -16,9 +17,12 @@ class OpenAIProvider(AIProvider):
             "Authorization": f"Bearer {self.settings.api_key}",
             "Content-Type": "application/json"
         }
+        self.http = http or HTTPSettings()
+        self.client = get_client("openai", self.http)
 
     @async_retry(retries=3, delays=[2, 5, 10])
     async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        self.last_usage = None
         messages = [{"role": "system", "content": system_prompt}] + history
         
         payload = {
@@ -28,41 +32,76 @@ class OpenAIProvider(AIProvider):
             "stream": False
         }
         
-        async with httpx.AsyncClient() as client:
+        try:
+            resp = await self.client.post(self.base_url, headers=self.headers, json=payload)
+            
+            if resp.status_code != 200:
+                error_text = resp.text
+                try:
+                    err_json = resp.json()
+                    if "error" in err_json:
+                        error_text = json.dumps(err_json["error"])
+                except: pass
+                raise ProviderHTTPError.from_response("OpenAI", resp, error_text)
+            
             try:
-                resp = await client.post(self.base_url, headers=self.headers, json=payload, timeout=60)
-                
+                data = resp.json()
+            except json.JSONDecodeError:
+                raise Exception(f"OpenAI returned invalid JSON: {resp.text[:200]}")
+            
+            if "error" in data:
+                raise Exception(f"OpenAI API Error: {data['error']}")
+            
+            if "choices" not in data or not data["choices"]:
+                raise Exception(f"OpenAI returned empty choices. Raw response: {data}")
+
+            self.last_usage = chat_usage(data.get("usage"))
+            
+            content = data['choices'][0]['message'].get('content')
+            
+            if not content:
+                raise Exception("OpenAI returned empty content string.")
+            
+            return content
+            
+        except httpx.TimeoutException:
+            raise Exception(f"OpenAI Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
+        except Exception as e:
+            raise e
+
+    @stream_retry(retries=3, delays=[2, 5, 10])
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        self.last_usage = None
+        messages = [{"role": "system", "content": system_prompt}] + history
+        
+        payload = {
+            "model": self.settings.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+
+        try:
+            async with self.client.stream("POST", self.base_url, headers=self.headers, json=payload) as resp:
                 if resp.status_code != 200:
-                    error_text = resp.text
-                    try:
-                        err_json = resp.json()
-                        if "error" in err_json:
-                            error_text = json.dumps(err_json["error"])
-                    except: pass
-                    raise Exception(f"OpenAI HTTP {resp.status_code}: {error_text}")
-                
-                try:
-                    data = resp.json()
-                except json.JSONDecodeError:
-                    raise Exception(f"OpenAI returned invalid JSON: {resp.text[:200]}")
-                
-                if "error" in data:
-                    raise Exception(f"OpenAI API Error: {data['error']}")
-                
-                if "choices" not in data or not data["choices"]:
-                    raise Exception(f"OpenAI returned empty choices. Raw response: {data}")
-                
-                content = data['choices'][0]['message'].get('content')
-                
-                if not content:
-                    raise Exception("OpenAI returned empty content string.")
-                
-                return content
-                
-            except httpx.TimeoutException:
-                raise Exception("OpenAI Timeout (60s). The model is too slow or down.")
-            except Exception as e:
-                raise e
+                    await resp.aread()
+                    raise ProviderHTTPError.from_response("OpenAI", resp, resp.text[:500])
+
+                async for chunk in iter_sse_json(resp):
+                    if "error" in chunk:
+                        raise Exception(f"OpenAI API Error: {chunk['error']}")
+                    if chunk.get("usage"):
+                        # Sent on the final chunk, which has no choices.
+                        self.last_usage = chat_usage(chunk["usage"])
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException:
+            raise Exception(f"OpenAI Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
 
     async def generate_image(self, prompt: str) -> str:
         return "OpenAI does not support direct image generation. Use Pollinations."
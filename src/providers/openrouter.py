@@ -1,15 +1,16 @@
 import httpx
 import json
-from typing import List, Dict
-from src.core.provider import AIProvider
-from src.config import OpenRouterSettings
-from src.utils import async_retry
+from typing import List, Dict, Optional, AsyncIterator
+from src.core.provider import AIProvider, ProviderHTTPError, chat_usage
+from src.core.http_pool import get_client, iter_sse_json
+from src.config import OpenRouterSettings, HTTPSettings
+from src.utils import async_retry, stream_retry
 from rich.console import Console
 
 console = Console()
 
 class OpenRouterProvider(AIProvider):
-    def __init__(self, settings: OpenRouterSettings):
+    def __init__(self, settings: OpenRouterSettings, http: Optional[HTTPSettings] = None):
         self.settings = settings
         if not self.settings.api_key:
             raise ValueError("OpenRouter API Key is not set.")
@@ -21,9 +22,12 @@ class OpenRouterProvider(AIProvider):
             "X-Title": self.settings.app_name,
             "Content-Type": "application/json"
         }
+        self.http = http or HTTPSettings()
+        self.client = get_client("openrouter", self.http)
 
     @async_retry(retries=3, delays=[2, 5, 10])
     async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        self.last_usage = None
         messages = [{"role": "system", "content": system_prompt}] + history
         
         payload = {
@@ -33,41 +37,76 @@ class OpenRouterProvider(AIProvider):
             "stream": False
         }
 
-        async with httpx.AsyncClient() as client:
+        try:
+            resp = await self.client.post(self.base_url, headers=self.headers, json=payload)
+            
+            if resp.status_code != 200:
+                error_text = resp.text
+                try:
+                    err_json = resp.json()
+                    if "error" in err_json:
+                        error_text = json.dumps(err_json["error"])
+                except: pass
+                raise ProviderHTTPError.from_response("OpenRouter", resp, error_text)
+
             try:
-                resp = await client.post(self.base_url, headers=self.headers, json=payload, timeout=60)
-                
-                if resp.status_code != 200:
-                    error_text = resp.text
-                    try:
-                        err_json = resp.json()
-                        if "error" in err_json:
-                            error_text = json.dumps(err_json["error"])
-                    except: pass
-                    raise Exception(f"OpenRouter HTTP {resp.status_code}: {error_text}")
+                data = resp.json()
+            except json.JSONDecodeError:
+                raise Exception(f"OpenRouter returned invalid JSON (possibly Cloudflare error): {resp.text[:200]}")
 
-                try:
-                    data = resp.json()
-                except json.JSONDecodeError:
-                    raise Exception(f"OpenRouter returned invalid JSON (possibly Cloudflare error): {resp.text[:200]}")
+            if "error" in data:
+                raise Exception(f"OpenRouter API Error: {data['error']}")
+            
+            if "choices" not in data or not data["choices"]:
+                raise Exception(f"OpenRouter returned empty choices. Raw response: {data}")
 
-                if "error" in data:
-                    raise Exception(f"OpenRouter API Error: {data['error']}")
-                
-                if "choices" not in data or not data["choices"]:
-                    raise Exception(f"OpenRouter returned empty choices. Raw response: {data}")
+            self.last_usage = chat_usage(data.get("usage"))
 
-                content = data['choices'][0]['message'].get('content')
-                
-                if not content:
-                    raise Exception("OpenRouter returned empty content string.")
+            content = data['choices'][0]['message'].get('content')
+            
+            if not content:
+                raise Exception("OpenRouter returned empty content string.")
 
-                return content
+            return content
 
-            except httpx.TimeoutException:
-                raise Exception("OpenRouter Timeout (60s). The model is too slow or down.")
-            except Exception as e:
-                raise e
+        except httpx.TimeoutException:
+            raise Exception(f"OpenRouter Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
+        except Exception as e:
+            raise e
+
+    @stream_retry(retries=3, delays=[2, 5, 10])
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        self.last_usage = None
+        messages = [{"role": "system", "content": system_prompt}] + history
+        
+        payload = {
+            "model": self.settings.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "stream": True,
+            "usage": {"include": True}
+        }
+
+        try:
+            async with self.client.stream("POST", self.base_url, headers=self.headers, json=payload) as resp:
+                if resp.status_code != 200:
+                    await resp.aread()
+                    raise ProviderHTTPError.from_response("OpenRouter", resp, resp.text[:500])
+
+                async for chunk in iter_sse_json(resp):
+                    if "error" in chunk:
+                        raise Exception(f"OpenRouter API Error: {chunk['error']}")
+                    if chunk.get("usage"):
+                        # Sent on the final chunk, which has no choices.
+                        self.last_usage = chat_usage(chunk["usage"])
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException:
+            raise Exception(f"OpenRouter Timeout ({self.http.timeout:.0f}s). The model is too slow or down.")
 
     async def generate_image(self, prompt: str) -> str:
         return "OpenRouter does not support direct image generation. Use Pollinations."
@@ -111,13 +150,12 @@ class OpenRouterProvider(AIProvider):
             "temperature": 0.1 # Low temp for precision
         }
 
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(self.base_url, headers=self.headers, json=payload, timeout=90)
-            
-            if resp.status_code != 200:
-                return f"Vision Error {resp.status_code}: {resp.text}"
-            
-            data = resp.json()
-            if "choices" in data and data["choices"]:
-                return data['choices'][0]['message']['content']
-            return "No description returned."
\ No newline at end of file
+        resp = await self.client.post(self.base_url, headers=self.headers, json=payload, timeout=90)
+        
+        if resp.status_code != 200:
+            return f"Vision Error {resp.status_code}: {resp.text}"
+        
+        data = resp.json()
+        if "choices" in data and data["choices"]:
+            return data['choices'][0]['message']['content']
+        return "No description returned."
\ No newline at end of file
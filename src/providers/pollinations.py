@@ -1,12 +1,12 @@
-import httpx
-from typing import List, Dict
+from typing import List, Dict, Optional
 from urllib.parse import quote
-from src.core.provider import AIProvider
-from src.config import PollinationsSettings
+from src.core.provider import AIProvider, ProviderHTTPError, chat_usage
+from src.config import PollinationsSettings, HTTPSettings
+from src.core.http_pool import get_client
 from src.utils import async_retry
 
 class PollinationsProvider(AIProvider):
-    def __init__(self, settings: PollinationsSettings):
+    def __init__(self, settings: PollinationsSettings, http: Optional[HTTPSettings] = None):
         self.settings = settings
         self.headers = {"Content-Type": "application/json"}
         if self.settings.api_key:
@@ -14,6 +14,7 @@ class PollinationsProvider(AIProvider):
             
         self.base_url_text = "https://text.pollinations.ai"
         self.base_url_image = "https://image.pollinations.ai/prompt"
+        self.client = get_client("pollinations", http)
 
     def _clean_response(self, text: str) -> str:
         ad_marker = "Support Pollinations.AI:"
@@ -22,8 +23,8 @@ class PollinationsProvider(AIProvider):
         return text
 
     def _check_errors(self, response):
-        if response.status_code in [500, 502, 503, 504]:
-            raise Exception(f"Server Error: {response.status_code}")
+        if response.status_code in [429, 500, 502, 503, 504]:
+            raise ProviderHTTPError.from_response("Pollinations", response, "Server Error")
         
         text = response.text.lower()
         if "bad gateway" in text or "cloudflare" in text or "service unavailable" in text:
@@ -31,40 +32,39 @@ class PollinationsProvider(AIProvider):
 
     @async_retry(retries=5, delays=[1, 2, 5, 10, 20])
     async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
-        short_history = history[-10:] if len(history) > 10 else history
-        
+        self.last_usage = None
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "model": self.settings.text_model,
-                    "messages": [{"role": "system", "content": system_prompt}] + short_history,
-                    "temperature": 0.7,
-                    "stream": False
-                }
-                if self.settings.reasoning_effort != "minimal":
-                    payload["reasoning_effort"] = self.settings.reasoning_effort
+            payload = {
+                "model": self.settings.text_model,
+                "messages": [{"role": "system", "content": system_prompt}] + history,
+                "temperature": 0.7,
+                "stream": False
+            }
+            if self.settings.reasoning_effort != "minimal":
+                payload["reasoning_effort"] = self.settings.reasoning_effort
 
-                resp = await client.post(f"{self.base_url_text}/openai", json=payload, headers=self.headers, timeout=60)
-                
-                self._check_errors(resp)
-                
-                if resp.status_code == 402: raise Exception("Tier Restriction")
-                resp.raise_for_status()
-                
-                raw_text = resp.json()['choices'][0]['message']['content']
-                return self._clean_response(raw_text)
+            resp = await self.client.post(f"{self.base_url_text}/openai", json=payload, headers=self.headers)
+            
+            self._check_errors(resp)
+            
+            if resp.status_code == 402: raise Exception("Tier Restriction")
+            resp.raise_for_status()
+            
+            data = resp.json()
+            self.last_usage = chat_usage(data.get("usage"))
+            raw_text = data['choices'][0]['message']['content']
+            return self._clean_response(raw_text)
         except Exception as e:
             if "Tier Restriction" in str(e): raise e
             
             conversation = f"System: {system_prompt}\n"
-            for msg in short_history: conversation += f"{msg['role']}: {msg['content']}\n"
+            for msg in history: conversation += f"{msg['role']}: {msg['content']}\n"
             safe_prompt = quote(conversation[-4000:]) 
             url = f"{self.base_url_text}/{safe_prompt}?model={self.settings.text_model}"
             
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, timeout=60)
-                self._check_errors(resp)
-                return self._clean_response(resp.text)
+            resp = await self.client.get(url)
+            self._check_errors(resp)
+            return self._clean_response(resp.text)
 
     @async_retry(retries=3, delays=[2, 5, 10])
     async def generate_image(self, prompt: str) -> str:
@@ -76,11 +76,10 @@ class PollinationsProvider(AIProvider):
     async def generate_audio(self, text: str) -> bytes:
         safe_text = quote(text)
         url = f"{self.base_url_text}/{safe_text}?model=openai-audio&voice={self.settings.voice}"
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, timeout=60)
-            self._check_errors(resp)
-            if resp.status_code != 200: raise Exception("API Error")
-            return resp.content
+        resp = await self.client.get(url)
+        self._check_errors(resp)
+        if resp.status_code != 200: raise Exception("API Error")
+        return resp.content
 
     async def analyze_image(self, prompt: str, image_url: str) -> str:
         return "Vision not available."
\ No newline at end of file
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import aclosing
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, List, Optional
+from src.config import RouterSettings
+from src.core.provider import AIProvider
+
+# Usage reported for the caller's last routed call. Concurrent calls (delegate_many agents)
+# each see their own, whichever backend served them.
+_last_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("router_last_usage", default=None)
+
+class Backend:
+    """One routed provider/model with a rolling window of latencies and outcomes."""
+    def __init__(self, name: str, provider: AIProvider, window: int):
+        self.name = name
+        self.provider = provider
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.down_until = 0.0
+        self.calls = 0
+        self.hedges_won = 0
+        self.hedges_lost = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def record(self, seconds: float, ok: bool):
+        self.latencies.append(seconds)
+        self.outcomes.append(ok)
+
+    def record_censored(self, seconds: float):
+        """A lower bound on latency from a cancelled request; it says nothing about errors."""
+        self.latencies.append(seconds)
+
+class RouterProvider(AIProvider):
+    """
+    Composite provider over several configured backends. Each call goes to the healthy
+    backend with the lowest rolling p50 latency and fails over to the next one on error.
+    With hedging on, a duplicate request is sent to the runner-up once the first has
+    been outstanding longer than `hedge_after` (or the backend's own p95), and whichever
+    answers first wins; the other request is cancelled. A cancelled loser that started
+    before the winner gets a censored latency sample (at least the winner's time plus the
+    hedge delay) but no error, so a backend that always stalls drops down the ranking
+    without being marked unhealthy; a loser that started after the winner is only
+    counted as a lost hedge. For
+    streams the race is to the first chunk. Image, audio and vision calls go to the first
+    backend.
+    """
+    def __init__(self, backends: Dict[str, AIProvider], settings: RouterSettings):
+        if not backends:
+            raise ValueError("Router has no usable backends.")
+        self.settings = settings
+        self.backends = [Backend(name, provider, settings.window) for name, provider in backends.items()]
+
+    @property
+    def last_usage(self):
+        return _last_usage.get()
+
+    def _healthy(self, backend: Backend, now: float) -> bool:
+        if backend.down_until > now:
+            return False
+        return len(backend.outcomes) < self.settings.min_samples or backend.error_rate <= self.settings.max_error_rate
+
+    def _ranked(self) -> List[Backend]:
+        """Healthy backends first, fastest p50 first; backends without enough samples keep config order ahead."""
+        now = time.monotonic()
+        def key(item):
+            index, backend = item
+            p50 = backend.percentile(0.5) if len(backend.latencies) >= self.settings.min_samples else None
+            return (not self._healthy(backend, now), p50 is not None, p50 or 0.0, index)
+        return [b for _, b in sorted(enumerate(self.backends), key=key)]
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        if not self.settings.hedge:
+            return None
+        if self.settings.hedge_after > 0:
+            return self.settings.hedge_after
+        if len(backend.latencies) >= self.settings.min_samples:
+            return max(backend.percentile(0.95), self.settings.min_hedge_after)
+        return None
+
+    def _failed(self, backend: Backend, seconds: float, error: BaseException):
+        backend.record(seconds, False)
+        recent = list(backend.outcomes)[-self.settings.failures_to_cooldown:]
+        if len(recent) == self.settings.failures_to_cooldown and not any(recent):
+            retry_after = getattr(error, "retry_after", None)
+            backend.down_until = time.monotonic() + max(self.settings.cooldown, retry_after or 0)
+
+    async def _race(self, start: Callable[[Backend], "asyncio.Future"], discard: Optional[Callable] = None):
+        """
+        Runs `start(backend)` on the best backend, hedging to the next one after the hedge
+        delay and failing over on errors. Returns the first successful result; results of
+        requests that lose the race are passed to `discard`.
+        """
+        queue = self._ranked()
+        pending: Dict[asyncio.Task, tuple] = {}
+        errors: List[str] = []
+        last_error: Optional[BaseException] = None
+        hedged = False
+        hedge_delay = 0.0
+        winner = None
+
+        def launch():
+            backend = queue.pop(0)
+            backend.calls += 1
+            pending[asyncio.ensure_future(start(backend))] = (backend, time.monotonic())
+
+        launch()
+        try:
+            while pending:
+                delay = None
+                if queue and not hedged:
+                    primary = next(iter(pending.values()))
+                    primary_delay = self._hedge_delay(primary[0])
+                    if primary_delay is not None:
+                        hedge_delay = primary_delay
+                        delay = max(0.0, primary[1] + primary_delay - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    backend, started = pending.pop(task)
+                    elapsed = time.monotonic() - started
+                    if task.exception() is None:
+                        backend.record(elapsed, True)
+                        if hedged:
+                            backend.hedges_won += 1
+                        winner = (started, elapsed)
+                        return task.result()
+                    last_error = task.exception()
+                    errors.append(f"{backend.name}: {last_error}")
+                    self._failed(backend, elapsed, last_error)
+                if not pending and queue:
+                    launch()
+        finally:
+            now = time.monotonic()
+            for task, (backend, started) in pending.items():
+                task.cancel()
+                if winner is None:
+                    continue
+                if started <= winner[0]:
+                    # Censored: it had a head start and still lost, so it was at least this slow.
+                    backend.record_censored(max(now - started, winner[1] + hedge_delay))
+                else:
+                    backend.hedges_lost += 1
+            if pending:
+                losers = await asyncio.gather(*pending, return_exceptions=True)
+                if discard:
+                    for result in losers:
+                        if not isinstance(result, BaseException):
+                            await discard(result)
+        if len(errors) == 1 and last_error is not None:
+            raise last_error
+        raise Exception("All providers failed: " + " | ".join(errors))
+
+    async def generate_text(self, history: List[Dict], system_prompt: str) -> str:
+        async def call(backend: Backend):
+            text = await backend.provider.generate_text(history, system_prompt)
+            # Snapshot right away: the backend's own last_usage is overwritten by its next call.
+            return text, backend.provider.last_usage
+
+        _last_usage.set(None)
+        text, usage = await self._race(call)
+        _last_usage.set(usage)
+        return text
+
+    async def stream_text(self, history: List[Dict], system_prompt: str) -> AsyncIterator[str]:
+        async def first_chunk(backend: Backend):
+            stream = backend.provider.stream_text(history, system_prompt)
+            try:
+                return backend, stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return backend, stream, ""
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def close(result):
+            await result[1].aclose()
+
+        _last_usage.set(None)
+        backend, stream, first = await self._race(first_chunk, close)
+        try:
+            async with aclosing(stream):
+                if first:
+                    yield first
+                async for delta in stream:
+                    yield delta
+        finally:
+            # Streamed usage arrives with the last chunk, if the caller read that far.
+            _last_usage.set(backend.provider.last_usage)
+
+    async def generate_image(self, prompt: str) -> str:
+        return await self.backends[0].provider.generate_image(prompt)
+
+    async def generate_audio(self, text: str) -> bytes:
+        return await self.backends[0].provider.generate_audio(text)
+
+    async def analyze_image(self, prompt: str, image_url: str) -> str:
+        return await self.backends[0].provider.analyze_image(prompt, image_url)
+
+    def report(self) -> str:
+        now = time.monotonic()
+        lines = []
+        for backend in self._ranked():
+            p50, p95 = backend.percentile(0.5), backend.percentile(0.95)
+            status = "healthy" if self._healthy(backend, now) else (
+                f"cooling down {backend.down_until - now:.0f}s" if backend.down_until > now else "unhealthy")
+            lines.append(
+                f"{backend.name}: {status} | p50 {p50 or 0:.1f}s | p95 {p95 or 0:.1f}s | "
+                f"errors {backend.error_rate * 100:.0f}% | calls {backend.calls} | "
+                f"hedges won {backend.hedges_won} | hedges lost {backend.hedges_lost}"
+            )
+        return "\n".join(lines)
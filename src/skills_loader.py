@@ -1,4 +1,6 @@
 import os
+import time
+import threading
 import yaml
 from pathlib import Path
 from typing import Dict, Optional
@@ -10,49 +12,102 @@ class RoleConfig:
         self.name = name
         self.prompt = content
         self.description = meta.get("description", "No description provided.")
-        self.tools = meta.get("tools", [])
+        self.tools = frozenset(meta.get("tools") or [])
 
-def load_role(name: str) -> Optional[RoleConfig]:
-    path = SKILLS_DIR / f"{name}.md"
-    if not path.exists():
+def _parse_role(name: str, path: Path) -> Optional[RoleConfig]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+    except OSError:
         return None
-    
-    with open(path, "r", encoding="utf-8") as f:
-        raw = f.read()
-    
+
     if raw.startswith("---"):
         try:
             parts = raw.split("---", 2)
             if len(parts) >= 3:
                 meta = yaml.safe_load(parts[1])
                 content = parts[2].strip()
-                return RoleConfig(name, content, meta)
+                return RoleConfig(name, content, meta if isinstance(meta, dict) else {})
         except Exception as e:
             print(f"[System] Warning: Failed to parse YAML for {name}: {e}")
-            
+
     return RoleConfig(name, raw, {"description": "Legacy role", "tools": []})
 
+class SkillRegistry:
+    """
+    In-process cache of parsed skill files. The directory is re-scanned at most
+    once per `refresh_interval` seconds and only files whose mtime or size
+    changed are parsed again.
+    """
+    def __init__(self, skills_dir: Path = SKILLS_DIR, refresh_interval: float = 1.0):
+        self.skills_dir = skills_dir
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self._roles: Dict[str, RoleConfig] = {}
+        self._stamps: Dict[str, tuple] = {}
+        self._overview: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self.version and now - self._checked_at < self.refresh_interval:
+            return
+
+        with self._lock:
+            self._checked_at = now
+            stamps = {}
+            if self.skills_dir.exists():
+                with os.scandir(self.skills_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".md"):
+                            st = entry.stat()
+                            stamps[entry.name[:-3]] = (st.st_mtime_ns, st.st_size)
+
+            if stamps == self._stamps and self.version:
+                return
+
+            for name, stamp in stamps.items():
+                if self._stamps.get(name) != stamp:
+                    role = _parse_role(name, self.skills_dir / f"{name}.md")
+                    if role:
+                        self._roles[name] = role
+            for name in set(self._roles) - set(stamps):
+                del self._roles[name]
+
+            self._stamps = stamps
+            self._overview = None
+            self.version += 1
+
+    def current_version(self) -> int:
+        self.refresh()
+        return self.version
+
+    def get(self, name: str) -> Optional[RoleConfig]:
+        self.refresh()
+        return self._roles.get(name)
+
+    def roles(self) -> Dict[str, RoleConfig]:
+        self.refresh()
+        return {name: role for name, role in sorted(self._roles.items()) if name != "system"}
+
+    def overview(self) -> str:
+        self.refresh()
+        if self._overview is None:
+            roles = self.roles()
+            if not roles:
+                self._overview = "No specialized roles available."
+            else:
+                self._overview = "\n".join(f"- {name}: {config.description}" for name, config in roles.items())
+        return self._overview
+
+skill_registry = SkillRegistry()
+
+def load_role(name: str) -> Optional[RoleConfig]:
+    return skill_registry.get(name)
+
 def get_all_roles() -> Dict[str, RoleConfig]:
-    roles = {}
-    if not SKILLS_DIR.exists():
-        return roles
-    
-    for f in SKILLS_DIR.glob("*.md"):
-        if f.stem == "system":
-            continue
-        
-        role = load_role(f.stem)
-        if role:
-            roles[f.stem] = role
-    return roles
+    return skill_registry.roles()
 
 def get_roles_overview() -> str:
-    roles = get_all_roles()
-    if not roles:
-        return "No specialized roles available."
-    
-    schema = []
-    for name, config in roles.items():
-        schema.append(f"- {name}: {config.description}")
-    
-    return "\n".join(schema)
\ No newline at end of file
+    return skill_registry.overview()
@@ -1,25 +1,58 @@
 import os
+import asyncio
 import subprocess
 import platform
 import httpx
-import requests
 import time
 import sys
 import inspect
 import re
 from typing import List
-from bs4 import BeautifulSoup
 from pathlib import Path
 from urllib.parse import quote
-from ddgs import DDGS
-from fake_useragent import UserAgent
 from src.core.memory import memory_core
 from src.core.sandbox import sandbox
-from src.utils import extract_json_from_text
+from src.utils import extract_json_from_text, console
+from src.core.http_pool import get_client
 
 TEMP_DIR = Path("tmp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Tools without side effects; safe to start while the model is still streaming.
+READ_ONLY_TOOLS = frozenset({
+    "read_files", "grep_files", "list_dir", "list_files_recursive", "get_code_skeleton",
+    "recall", "memory_stats", "web_search", "visit_page", "get_weather"
+})
+
+# Execution class and timeout (seconds) per tool, consumed by src/core/dispatcher.py.
+# "async" runs on the event loop, "io" on the thread pool, "cpu" on the process pool
+# (through its entry in src/core/cpu_tools.py; without one it runs on the thread pool).
+# A timeout of None uses settings.tools.timeout; 0 disables it.
+# Tools using the shared HTTP client stay "async": the client is bound to the main loop.
+# Memory tools make blocking KG/Chroma calls (the first recall may import chromadb), so they are "io".
+# Unlisted tools default to "async" for coroutines and "io" for plain functions.
+TOOL_PROFILES = {
+    "read_files": ("io", None),
+    "grep_files": ("io", None),
+    "list_dir": ("io", None),
+    "list_files_recursive": ("io", None),
+    "write_file": ("io", None),
+    "append_file": ("io", None),
+    "execute_command": ("async", 0),
+    "take_screenshot": ("io", 30),
+    "mouse_click": ("io", 30),
+    "type_text": ("io", None),
+    "get_code_skeleton": ("cpu", 60),
+    "run_safe_code": ("async", 300),
+    "delegate_to": ("async", 0),
+    "delegate_many": ("async", 0),
+    "analyze_screen": ("async", None),
+    "remember": ("io", None),
+    "recall": ("io", None),
+    "memory_stats": ("io", None),
+    "clear_memory": ("io", None),
+}
+
 WMO_CODES = {
     0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
     45: "Fog", 48: "Depositing rime fog",
@@ -33,8 +66,8 @@ def _is_safe_path(path_str: str) -> bool:
     try:
         if not path_str or not isinstance(path_str, str): return False
         
-        from src.config import load_config
-        config = load_config()
+        from src.config import get_settings
+        config = get_settings()
         
         target_path = Path(path_str).resolve()
         project_root = Path.cwd().resolve()
@@ -51,30 +84,33 @@ def _is_safe_path(path_str: str) -> bool:
         return False
     except: return False
 
+_provider_cache = (None, None)
+
 def _get_active_provider():
-    from src.config import load_config
-    from src.providers.pollinations import PollinationsProvider
-    from src.providers.gemini import GeminiProvider
-    from src.providers.openrouter import OpenRouterProvider
-    from src.providers.openai import OpenAIProvider
-    from src.providers.anthropic import AnthropicProvider
-    config = load_config()
-    try:
-        if config.provider == "gemini" and config.gemini.api_key: return GeminiProvider(config.gemini)
-        elif config.provider == "openrouter" and config.openrouter.api_key: return OpenRouterProvider(config.openrouter)
-        elif config.provider == "openai" and config.openai.api_key: return OpenAIProvider(config.openai)
-        elif config.provider == "anthropic" and config.anthropic.api_key: return AnthropicProvider(config.anthropic)
-        else: return PollinationsProvider(config.pollinations)
-    except: return PollinationsProvider(config.pollinations)
+    """Provider for sub-agents and vision tools, rebuilt only when its settings change."""
+    global _provider_cache
+    from src.config import get_settings
+    from src.providers.factory import build_provider
+    config = get_settings()
+    key = (config.provider, config.model_dump_json(include={config.provider, "http", "response_cache"}))
+    if _provider_cache[0] == key:
+        return _provider_cache[1]
+    try: provider = build_provider(config)
+    except: provider = build_provider(config, "pollinations")
+    _provider_cache = (key, provider)
+    return provider
+
+def _http_client():
+    from src.config import get_settings
+    return get_client("tools", get_settings().http)
 
 async def download_and_open_image(url: str, **kwargs) -> str:
     try:
         filename = f"img_{int(time.time())}.jpg"
         path = TEMP_DIR / filename
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url)
-            if resp.status_code != 200: return f"Download Failed: {resp.status_code}"
-            with open(path, "wb") as f: f.write(resp.content)
+        resp = await _http_client().get(url)
+        if resp.status_code != 200: return f"Download Failed: {resp.status_code}"
+        with open(path, "wb") as f: f.write(resp.content)
         
         if platform.system() == "Windows": os.startfile(path)
         elif platform.system() == "Darwin": subprocess.run(["open", str(path)])
@@ -84,8 +120,8 @@ async def download_and_open_image(url: str, **kwargs) -> str:
 
 async def generate_image(prompt: str, width: int = None, height: int = None, **kwargs) -> str:
     try:
-        from src.config import load_config
-        config = load_config()
+        from src.config import get_settings
+        config = get_settings()
         safe_prompt = quote(prompt)
         actual_width = width if width is not None else config.pollinations.image_width
         actual_height = height if height is not None else config.pollinations.image_height
@@ -95,39 +131,42 @@ async def generate_image(prompt: str, width: int = None, height: int = None, **k
 
 async def web_search(query: str, **kwargs) -> str:
     try:
-        results = DDGS().text(query, max_results=5)
+        from ddgs import DDGS
+        results = await asyncio.to_thread(lambda: DDGS().text(query, max_results=5))
         if not results: return "No results found."
         return "\n".join([f"- {r['title']}: {r['href']}\n  Snippet: {r['body']}" for r in results])
     except Exception as e: return f"Search Error: {e}"
 
+def _html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for s in soup(["script", "style", "nav", "footer", "header", "form", "svg"]): s.decompose()
+    return ' '.join(soup.get_text(separator=' ', strip=True).split())
+
 async def visit_page(url: str, **kwargs) -> str:
     try:
+        from fake_useragent import UserAgent
         ua = UserAgent()
         headers = {"User-Agent": ua.random, "Accept": "text/html"}
-        async with httpx.AsyncClient(follow_redirects=True, timeout=20) as client:
-            resp = await client.get(url, headers=headers)
-            if resp.status_code == 403: return f"Error 403: Access Denied."
-            resp.raise_for_status()
-            html = resp.text
-
-        soup = BeautifulSoup(html, 'html.parser')
-        for s in soup(["script", "style", "nav", "footer", "header", "form", "svg"]): s.decompose()
-        text = ' '.join(soup.get_text(separator=' ', strip=True).split())
+        resp = await _http_client().get(url, headers=headers, follow_redirects=True, timeout=20)
+        if resp.status_code == 403: return f"Error 403: Access Denied."
+        resp.raise_for_status()
+        text = await asyncio.to_thread(_html_to_text, resp.text)
         return text[:14000] + ("..." if len(text) > 14000 else "")
     except Exception as e: return f"Browsing Error: {e}"
 
 async def get_weather(city: str, **kwargs) -> str:
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"https://geocoding-api.open-meteo.com/v1/search?name={city}&count=1&language=en&format=json")
-            data = resp.json()
-            if not data.get("results"): return "City not found."
-            lat, lon = data["results"][0]["latitude"], data["results"][0]["longitude"]
-            
-            w_resp = await client.get(f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m")
-            curr = w_resp.json()["current"]
-            cond = WMO_CODES.get(curr['weather_code'], "Unknown")
-            return f"Weather in {data['results'][0]['name']}:\nCondition: {cond}\nTemp: {curr['temperature_2m']}°C\nHumidity: {curr['relative_humidity_2m']}%\nWind: {curr['wind_speed_10m']} km/h"
+        client = _http_client()
+        resp = await client.get(f"https://geocoding-api.open-meteo.com/v1/search?name={city}&count=1&language=en&format=json")
+        data = resp.json()
+        if not data.get("results"): return "City not found."
+        lat, lon = data["results"][0]["latitude"], data["results"][0]["longitude"]
+        
+        w_resp = await client.get(f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,weather_code,wind_speed_10m")
+        curr = w_resp.json()["current"]
+        cond = WMO_CODES.get(curr['weather_code'], "Unknown")
+        return f"Weather in {data['results'][0]['name']}:\nCondition: {cond}\nTemp: {curr['temperature_2m']}°C\nHumidity: {curr['relative_humidity_2m']}%\nWind: {curr['wind_speed_10m']} km/h"
     except Exception as e: return f"Weather Error: {e}"
 
 async def read_files(paths: str, **kwargs) -> str:
@@ -231,7 +270,11 @@ async def append_file(path: str, content: str, **kwargs) -> str:
         return f"Appended to: {path}"
     except Exception as e: return f"Append Error: {e}"
 
-def execute_command(command: str, **kwargs) -> str:
+def _print_output_line(line: str):
+    from rich.text import Text
+    console.print(Text(f"  │ {line}", style="dim"))
+
+async def execute_command(command: str, **kwargs) -> str:
     try:
         if not command or not isinstance(command, str):
             return "Error: Invalid command."
@@ -242,20 +285,25 @@ def execute_command(command: str, **kwargs) -> str:
         else:
             shell_cmd = command
 
-        result = subprocess.run(
-            shell_cmd, 
-            shell=True, 
-            capture_output=True, 
-            text=True,
-            timeout=120
+        from src.config import get_settings
+        from src.core.process_runner import run_process
+        cfg = get_settings().tools
+        result = await run_process(
+            shell_cmd,
+            timeout=cfg.command_timeout,
+            cpu_seconds=cfg.cpu_limit_seconds,
+            memory_mb=cfg.memory_limit_mb,
+            head_bytes=cfg.output_head_kb * 1024,
+            tail_bytes=cfg.output_tail_kb * 1024,
+            on_output=_print_output_line if cfg.stream_output else None
         )
-        
-        output = result.stdout
-        if result.stderr: 
-            output += f"\nSTDERR:\n{result.stderr}"
-        return output.strip() or "Executed successfully (no output)."
-    except subprocess.TimeoutExpired:
-        return "Error: Command timed out."
+
+        output = result.output.strip()
+        if result.timed_out:
+            return f"Error: Command timed out after {cfg.command_timeout:g}s (process tree killed).\n{output}".strip()
+        if result.exit_code:
+            return f"[EXIT CODE {result.exit_code}]\n{output}"
+        return output or "Executed successfully (no output)."
     except Exception as e:
         return f"Execution Error: {e}"
 
@@ -300,12 +348,122 @@ async def delegate_to(agent_name: str, task: str, **kwargs) -> str:
     """Delegates to a specialized agent."""
     try:
         from src.core.base_agent import BaseAgent
-        from src.config import load_config
-        config = load_config()
+        from src.core.agent_pool import agent_pool
+        from src.core.mcp_manager import mcp_registry
+        from src.skills_loader import skill_registry
+        from src.config import get_settings
+        config = get_settings()
         provider = _get_active_provider()
-        agent = BaseAgent(name=agent_name.capitalize(), provider=provider, skill_name=agent_name.lower().strip(), settings=config)
-        agent.tools = TOOL_REGISTRY
-        return await agent.run(task)
+        role = agent_name.lower().strip()
+
+        def build():
+            agent = BaseAgent(name=agent_name.capitalize(), provider=provider, skill_name=role, settings=config)
+            agent.tools = TOOL_REGISTRY
+            return agent
+
+        key = ("delegate", role, config.mode, id(provider))
+        async with mcp_registry.lease(config) as mcp:
+            with agent_pool.lease(key, skill_registry.current_version(), build) as agent:
+                agent.settings = config
+                agent.attach_mcp(mcp)
+                return await agent.run(task)
+    except Exception as e:
+        return f"Delegation Error: {e}"
+
+def _fan_out_worker(agent_name: str, provider, config):
+    from src.core.base_agent import BaseAgent
+    from src.skills_loader import load_role
+    role = agent_name.lower().strip()
+    agent = BaseAgent(name=agent_name, provider=provider, skill_name=role, settings=config)
+    role_config = load_role(role)
+    if role_config:
+        agent.system_prompt = role_config.prompt
+    # Workers of a fan-out do not delegate further.
+    allowed = role_config.tools if role_config and role_config.tools else None
+    agent.tools = {
+        k: v for k, v in TOOL_REGISTRY.items()
+        if k not in ("delegate_to", "delegate_many") and (allowed is None or k in allowed)
+    }
+    return agent
+
+def _partial_result(agent) -> str:
+    for msg in reversed(agent.history):
+        content = str(msg.get("content", ""))
+        if msg.get("role") == "user" and content.startswith("TOOL RESULT"):
+            return content[:2000]
+    return "No intermediate results."
+
+async def delegate_many(tasks: list, timeout: float = None, **kwargs) -> str:
+    """Runs several agents concurrently. tasks: [{"agent_name": "Researcher", "task": "...", "timeout": 120}, ...]; timeout is optional."""
+    try:
+        from src.config import get_settings
+        config = get_settings()
+        if isinstance(tasks, str):
+            import json
+            tasks = json.loads(tasks)
+        tasks = [t for t in tasks if isinstance(t, dict) and t.get("agent_name") and t.get("task")]
+        if not tasks:
+            return "Error: Provide tasks as a list of {agent_name, task}."
+        if len(tasks) > config.delegation.max_agents:
+            return f"Error: At most {config.delegation.max_agents} agents per delegate_many call."
+
+        from src.core.agent_pool import agent_pool
+        from src.core.mcp_manager import mcp_registry
+        from src.skills_loader import skill_registry
+        budget = float(timeout or config.delegation.timeout)
+        provider = _get_active_provider()
+        version = skill_registry.current_version()
+        agents, keys = [], []
+        mcp = mcp_registry.acquire(config)
+        try:
+            for i, t in enumerate(tasks, 1):
+                name = t["agent_name"].strip().capitalize()
+                key = ("fan_out", name.lower(), config.mode, id(provider))
+                agent = agent_pool.acquire(key, version, lambda: _fan_out_worker(name, provider, config))
+                agents.append(agent)
+                keys.append(key)
+                agent.name = f"{name}#{i}"
+                agent.settings = config
+                agent.attach_mcp(mcp)
+                agent.max_steps = config.delegation.max_steps
+
+            budgets = [float(t.get("timeout") or budget) for t in tasks]
+            started = time.monotonic()
+            finished = {}
+
+            async def run_one(i: int):
+                try:
+                    result = await asyncio.wait_for(agents[i].run(tasks[i]["task"]), budgets[i])
+                    finished[i] = ("done", result)
+                except asyncio.TimeoutError:
+                    finished[i] = (f"timed out after {budgets[i]:g}s, partial", _partial_result(agents[i]))
+                except asyncio.CancelledError:
+                    finished[i] = ("cancelled, partial", _partial_result(agents[i]))
+                    raise
+                except Exception as e:
+                    finished[i] = ("failed", f"Error: {e}")
+                finally:
+                    finished[i] += (time.monotonic() - started,)
+
+            # Fan-in: wait for everyone up to the largest budget, then cancel stragglers.
+            jobs = [asyncio.create_task(run_one(i)) for i in range(len(agents))]
+            try:
+                await asyncio.wait(jobs, timeout=max(budgets) + 5)
+            finally:
+                for job in jobs:
+                    job.cancel()
+                await asyncio.gather(*jobs, return_exceptions=True)
+
+            report = []
+            for i, agent in enumerate(agents):
+                status, result, elapsed = finished.get(i, ("cancelled", _partial_result(agent), time.monotonic() - started))
+                report.append(f"### [{i + 1}] {agent.name} ({status}, {elapsed:.1f}s)\n{result}")
+        finally:
+            # Every agent checked out so far goes back, even on a failed acquire or a cancelled fan-in.
+            for key, agent in zip(keys, agents):
+                agent_pool.release(key, agent)
+            await mcp_registry.release()
+        return "\n\n".join(report)
     except Exception as e:
         return f"Delegation Error: {e}"
 
@@ -335,19 +493,7 @@ async def clear_memory(confirm: str = "no", **kwargs) -> str:
     try:
         if confirm.lower() != "yes":
             return "Error: Use confirm='yes' to clear memory."
-        
-        import shutil
-        from pathlib import Path
-        
-        memory_dir = Path("tmp/memory")
-        if memory_dir.exists():
-            shutil.rmtree(memory_dir)
-            memory_dir.mkdir(parents=True, exist_ok=True)
-            
-        global memory_core
-        from src.core.memory import MemoryManager
-        memory_core = MemoryManager()
-        
+        memory_core.reset()
         return "Memory cleared."
     except Exception as e:
         return f"Clear Memory Error: {e}"
@@ -370,10 +516,9 @@ async def debug_system_prompt(**kwargs) -> str:
     from src.utils import get_system_context
     from src.skills_loader import load_role, get_roles_overview
     from src.core.memory import memory_core
-    from src.config import load_config
-    from src.core.mcp_manager import MCPManager
+    from src.config import get_settings
     
-    config = load_config()
+    config = get_settings()
     
     try:
         base_prompt = load_role("system")
@@ -390,7 +535,6 @@ async def debug_system_prompt(**kwargs) -> str:
 
     mcp_tools = "MCP DISABLED"
     if config.mcp_enabled:
-        temp_mcp = MCPManager(config)
         enabled_servers = [k for k, v in config.mcp_servers.items() if v.enabled]
         mcp_tools = f"MCP Servers Enabled: {', '.join(enabled_servers)}"
 
@@ -463,37 +607,18 @@ async def type_text(text: str, **kwargs) -> str:
         return f"Type Error: {e}"
     
 async def run_safe_code(code: str, **kwargs) -> str:
-    """Executes Python code inside a secure Docker Sandbox."""
-    if not sandbox.is_active():
+    """Executes Python code inside a secure Docker Sandbox. CWD is scratch; save files to keep under /workspace."""
+    if not await asyncio.to_thread(sandbox.is_active):
         return "Error: Docker Sandbox is offline."
     
-    return sandbox.execute(code)
+    from src.config import get_settings
+    on_output = _print_output_line if get_settings().tools.stream_output else None
+    return await asyncio.to_thread(sandbox.execute, code, on_output)
 
 async def get_code_skeleton(path: str, **kwargs) -> str:
     """Reads a Python file and returns ONLY the structure."""
-    import ast
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            source = f.read()
-            tree = ast.parse(source)
-            
-        skeleton = []
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                skeleton.append(f"\n[Line {node.lineno}] class {node.name}:")
-                for item in node.body:
-                    if isinstance(item, ast.FunctionDef):
-                        args = [a.arg for a in item.args.args]
-                        skeleton.append(f"    [Line {item.lineno}] def {item.name}({', '.join(args)}): ...")
-            elif isinstance(node, ast.FunctionDef):
-                if not isinstance(getattr(node, "parent", None), ast.ClassDef):
-                    if node.col_offset == 0:
-                        args = [a.arg for a in node.args.args]
-                        skeleton.append(f"[Line {node.lineno}] def {node.name}({', '.join(args)}): ...")
-        return "\n".join(skeleton) if skeleton else "No structure found (script or empty)."
-    except Exception as e:
-        return f"Skeleton Error: {e}"
+    from src.core.cpu_tools import code_skeleton
+    return code_skeleton(path)
 
 def _generate_registry():
     current_module = sys.modules[__name__]
@@ -1,13 +1,34 @@
 import asyncio
 import functools
+import json
 import os
 import platform
+import random
 from datetime import datetime
 import re
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional
 from rich.console import Console
 
 console = Console()
 
+# A Retry-After longer than this is not waited out: the error is raised so callers can fail over.
+MAX_RETRY_AFTER = 60.0
+
+def retry_delay(error: Exception, attempt: int, delays: List[float]) -> Optional[float]:
+    """
+    Seconds to wait before the next attempt, or None if retrying is pointless. Uses the
+    server's Retry-After when given, otherwise a random wait in [delay/2, delay] so that
+    concurrent callers do not retry in lockstep.
+    """
+    if not getattr(error, "retryable", True):
+        return None
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.5) if retry_after <= MAX_RETRY_AFTER else None
+    base = delays[attempt] if attempt < len(delays) else delays[-1]
+    return random.uniform(base / 2, base)
+
 def async_retry(retries=3, delays=[2, 5, 10]):
     def decorator(func):
         @functools.wraps(func)
@@ -16,10 +37,32 @@ def async_retry(retries=3, delays=[2, 5, 10]):
                 try:
                     return await func(*args, **kwargs)
                 except Exception as e:
-                    if i == retries:
+                    wait_time = retry_delay(e, i, delays) if i < retries else None
+                    if wait_time is None:
+                        raise e
+                    console.print(f"[bold yellow]Wait {wait_time:.1f}s... (Error: {e})[/bold yellow]")
+                    await asyncio.sleep(wait_time)
+        return wrapper
+    return decorator
+
+def stream_retry(retries=3, delays=[2, 5, 10]):
+    """Like async_retry for async generators: retries only while nothing has been yielded yet."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for i in range(retries + 1):
+                started = False
+                try:
+                    async with aclosing(func(*args, **kwargs)) as stream:
+                        async for chunk in stream:
+                            started = True
+                            yield chunk
+                    return
+                except Exception as e:
+                    wait_time = retry_delay(e, i, delays) if not started and i < retries else None
+                    if wait_time is None:
                         raise e
-                    wait_time = delays[i] if i < len(delays) else delays[-1]
-                    console.print(f"[bold yellow]Wait {wait_time}s... (Error: {e})[/bold yellow]")
+                    console.print(f"[bold yellow]Wait {wait_time:.1f}s... (Error: {e})[/bold yellow]")
                     await asyncio.sleep(wait_time)
         return wrapper
     return decorator
@@ -30,21 +73,188 @@ def get_system_context() -> str:
     shell_info = os.getenv("SHELL", "Unknown")
     return f"CONTEXT: [Time: {now}] [OS: {os_info}] [Shell: {shell_info}]"
 
+ACTION_KEYS = ("tool", "calls")
+
+def _action_json(raw: str) -> bool:
+    """True for a JSON object carrying an action ("tool" or "calls"), not just any braces."""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and any(k in data for k in ACTION_KEYS)
+
+class StreamingJSONParser:
+    """
+    Incremental parser for the first action JSON object in a streamed completion.
+    Only new characters are scanned on each feed(); completed top-level values
+    (and the fields of nested objects such as args) become available as soon
+    as they close, before the rest of the object has arrived. A closed object
+    that is not an action (a brace in prose, a code snippet) is dropped and the
+    scan resumes just after its opening brace.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.start = -1
+        self.end = -1
+        self.complete = False
+        self.values: Dict[tuple, Any] = {}
+        self._pos = 0
+        self._stack: List[Dict[str, Any]] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+
+    def _restart(self):
+        self.start = -1
+        self.end = -1
+        self.complete = False
+        self.values = {}
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> "StreamingJSONParser":
+        self.buffer += chunk
+        buf = self.buffer
+        i = self._pos - 1
+        while i + 1 < len(buf) and not self.complete:
+            i += 1
+            c = buf[i]
+
+            if self.start < 0:
+                if c == "{":
+                    self.start = i
+                    self._stack.append({"type": "obj", "key": None, "expect_key": True, "value_start": None, "primitive": None})
+                continue
+
+            frame = self._stack[-1]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        frame["key"] = self._decode(buf[self._string_start:i])
+                        frame["expect_key"] = False
+                    else:
+                        self._complete_value(frame["value_start"], i + 1)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                self._string_is_key = frame["type"] == "obj" and frame["expect_key"]
+                if not self._string_is_key:
+                    frame["value_start"] = i
+            elif c in "{[":
+                frame["value_start"] = i
+                self._stack.append({"type": "obj" if c == "{" else "arr", "key": None, "expect_key": c == "{", "value_start": None, "primitive": None})
+            elif c in "}]":
+                self._finish_primitive(frame, i)
+                self._stack.pop()
+                if not self._stack:
+                    if _action_json(buf[self.start:i + 1]):
+                        self.complete = True
+                        self.end = i
+                        break
+                    i = self.start
+                    self._restart()
+                    continue
+                self._complete_value(self._stack[-1]["value_start"], i + 1)
+            elif c == ",":
+                self._finish_primitive(frame, i)
+                if frame["type"] == "obj":
+                    frame["expect_key"] = True
+                    frame["key"] = None
+            elif c != ":" and not c.isspace() and frame["primitive"] is None:
+                frame["primitive"] = i
+                frame["value_start"] = i
+        self._pos = len(buf)
+        return self
+
+    def _path(self):
+        if any(f["type"] != "obj" or f["key"] is None for f in self._stack):
+            return None
+        return tuple(f["key"] for f in self._stack)
+
+    def _complete_value(self, start, end):
+        path = self._path()
+        if path is None or start is None or len(path) > 2:
+            return
+        try:
+            self.values[path] = json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            pass
+
+    def _finish_primitive(self, frame, end):
+        if frame["primitive"] is not None:
+            self._complete_value(frame["primitive"], end)
+            frame["primitive"] = None
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        raw = re.sub(r'\\u[0-9a-fA-F]{0,3}$', "", raw)
+        if (len(raw) - len(raw.rstrip("\\"))) % 2:
+            raw = raw[:-1]
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw.replace('\\n', '\n').replace('\\"', '"')
+
+    def has(self, *path) -> bool:
+        return path in self.values
+
+    def get(self, *path, default=None):
+        return self.values.get(path, default)
+
+    def partial(self, *path) -> Optional[str]:
+        """Value of a string field, decoded up to the last received character if still open."""
+        if path in self.values:
+            value = self.values[path]
+            return value if isinstance(value, str) else None
+        if self._in_string and not self._string_is_key and self._path() == path:
+            return self._decode(self.buffer[self._string_start:])
+        return None
+
+    @property
+    def json_text(self) -> Optional[str]:
+        return self.buffer[self.start:self.end + 1] if self.complete else None
+
 def extract_json_from_text(text: str):
+    """The action JSON in a reply, or None when the reply is prose (braces in code included)."""
     match = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
-    if match: return match.group(1)
+    if match and _action_json(match.group(1)): return match.group(1)
+
+    parser = StreamingJSONParser().feed(text)
+    if parser.complete:
+        return parser.json_text
+
+    # Malformed action JSON is still returned so the caller can report the parse error to the model.
     match = re.search(r'(\{.*\})', text, re.DOTALL)
-    if match: return match.group(1)
+    if match and re.search(r'"(tool|calls)"\s*:', match.group(1)): return match.group(1)
     return None
 
-def print_token_usage(history: list, response: str):
-    """Prints estimated token usage and cost indicator."""
-    input_text = "".join([str(m.get('content', '')) for m in history])
-    input_tokens = len(input_text) // 4
-    output_tokens = len(response) // 4
+def print_token_usage(history: list, response: str, usage: Optional[dict] = None, model: Optional[str] = None):
+    """Prints token usage (provider-reported when available, counted with the model's tokenizer otherwise) and cost indicator."""
+    from src.core.history import get_counter
+    counter = get_counter(model)
+    cache_info = ""
+    if usage and usage.get("input_tokens") is not None:
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        cache_write = usage.get("cache_creation_input_tokens") or 0
+        input_tokens = usage["input_tokens"] + cache_read + cache_write
+        output_tokens = usage.get("output_tokens") or counter.count(response)
+        if cache_read or cache_write:
+            cache_info = f" | Cache hit: [cyan]{cache_read}[/cyan] miss: {cache_write}"
+    else:
+        input_tokens = counter.count_messages(history)
+        output_tokens = counter.count(response)
     total = input_tokens + output_tokens
     color = "green"
     if total > 4000: color = "yellow"
     if total > 16000: color = "red"
     
-    console.print(f"[dim]🎫 Tokens: [{color}]{total}[/{color}] (In: {input_tokens} | Out: {output_tokens})[/dim]", justify="right")
\ No newline at end of file
+    console.print(f"[dim]🎫 Tokens: [{color}]{total}[/{color}] (In: {input_tokens} | Out: {output_tokens}{cache_info})[/dim]", justify="right")
\ No newline at end of file